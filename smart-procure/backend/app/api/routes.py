@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, BackgroundTasks, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from urllib.parse import quote
 from datetime import datetime
-from ..models.types import ChatRequest, ChatResponse, UpdateAction
-from ..models.database import get_db, init_db, User
+from ..models.types import (
+    BatchChatRequest,
+    BatchChatResponse,
+    ChatHistoryMessage,
+    ChatRequest,
+    ChatResponse,
+    UpdateAction,
+)
+from ..models.database import SessionLocal, get_db, init_db, User
 from ..services.db_service import DBService
 from ..services.supplier_service import SupplierService
-from ..services.excel_core import process_update
+from ..services.excel_core import process_update, process_updates
 from ..services.excel_export import export_sheet_to_excel
 from ..services.web_search import search_suppliers_online, format_search_results
 from ..services.browser_service import browse_page_sync, search_baidu_sync
@@ -23,26 +32,48 @@ from ..mcp import (
     browser_scroll,
     browser_back,
 )
-from ..core.llm import call_llm
+from ..core.llm import acall_llm
+from ..core import json_utils
 from ..services.agent_runtime import ToolRegistry, run_two_stage_agent
 from ..services.sheet_schema import (
     build_sheet_schema,
     build_writable_fields,
+    cell_text,
+    compute_completion_rate,
+    is_cell_filled,
     extract_row_from_message,
-    find_candidate_rows,
     locate_rows_by_criteria,
     get_row_slot_snapshot,
-    fuzzy_match_rows,
+    BRAND_MATCH_THRESHOLD,
+    fuzzy_match_rows_batch,
+    fuzzy_match_score,
+    normalize_header,
 )
 from ..auth.utils import get_current_user
-import json
-import pandas as pd
+import asyncio
+import base64
+import logging
+import hashlib
+import heapq
+import orjson
 import io
+import os
 import uuid
 import re
+import tempfile
+import threading
+from collections import defaultdict
+from python_calamine import CalamineWorkbook
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# UpdateAction 可接受的字段名（兼容 pydantic v1/v2），模块加载时计算一次
+_UPDATE_ACTION_FIELDS = frozenset(
+    (getattr(UpdateAction, "model_fields", None) or getattr(UpdateAction, "__fields__", {})).keys()
+)
+
 # Initialize database on startup
 init_db()
 
@@ -87,6 +118,33 @@ class SheetListItem(BaseModel):
     updated_at: str
 
 
+class SupplierOut(BaseModel):
+    id: int
+    company_name: str
+    contact_phone: Optional[str] = None
+    contact_name: Optional[str] = None
+    owner: Optional[str] = None
+    tags: List[str] = []
+    quote_count: Optional[int] = None
+    last_quote_date: Optional[datetime] = None
+
+    @field_validator("tags", mode="before")
+    @classmethod
+    def _tags_or_empty(cls, v):
+        return v or []
+
+    class Config:
+        from_attributes = True
+
+
+class SupplierSearchResponse(BaseModel):
+    suppliers: List[SupplierOut]
+
+
+class BulkDeleteSuppliersRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=500, description="要删除的供应商 ID")
+
+
 class RecommendRequest(BaseModel):
     product_name: str = Field("", max_length=200, description="产品名称")
     spec: Optional[str] = Field("", max_length=500, description="规格型号")
@@ -94,11 +152,17 @@ class RecommendRequest(BaseModel):
     limit: Optional[int] = Field(5, ge=1, le=20, description="返回数量限制")
 
 
-def get_sheet_state_summary(sheet_data):
+# 用户消息分词（空白、中英文逗号、顿号），模块级编译一次
+_TOKEN_SPLIT_RE = re.compile(r'[\s,，、]+')
+
+
+def get_sheet_state_summary(sheet_data, schema=None):
+    """表格询价进度摘要。sheet_data 每行均为 list（由 ChatRequest 校验保证）"""
     if not sheet_data or len(sheet_data) < 2 or not isinstance(sheet_data[0], list):
         return "空"
 
-    schema = build_sheet_schema(sheet_data)
+    if schema is None:
+        schema = build_sheet_schema(sheet_data)
     slots = schema.get("slots") or {}
     slot_count = len(slots.keys()) if isinstance(slots, dict) else 0
     cols = schema.get("item_columns") or {}
@@ -106,46 +170,39 @@ def get_sheet_state_summary(sheet_data):
     brand_col = cols.get("brand")
     model_col = cols.get("model")
 
-    def _cell(row, idx):
-        if not isinstance(idx, int):
-            return ""
-        if not isinstance(row, list) or idx < 0 or idx >= len(row):
-            return ""
-        v = row[idx]
-        if v is None:
-            return ""
-        s = str(v).strip()
-        return "" if s.lower() == "none" else s
-
-    def _has_price(row, slot_num: int) -> bool:
-        slot_map = slots.get(slot_num) or {}
-        price_idx = slot_map.get("单价")
-        if not isinstance(price_idx, int):
-            return False
-        v = row[price_idx] if isinstance(row, list) and price_idx < len(row) else None
-        if v is None:
-            return False
-        s = str(v).strip()
-        return s != "" and s.lower() != "none"
-
-    slot_nums = sorted([int(k) for k in (slots.keys() if isinstance(slots, dict) else []) if isinstance(k, int)])
+    # 列下标是否有效与行无关，循环外判断一次；无效列置为 None
+    name_col, brand_col, model_col = (
+        c if isinstance(c, int) and c >= 0 else None for c in (name_col, brand_col, model_col)
+    )
+
+    slot_nums = schema.get("slot_nums")
+    if slot_nums is None:
+        slot_nums = sorted([int(k) for k in (slots.keys() if isinstance(slots, dict) else []) if isinstance(k, int)])
     if not slot_nums:
         slot_nums = [1]
+    # 各槽位的单价列下标与行无关，循环外取一次
+    price_indices = [
+        idx for idx in ((slots.get(n) or {}).get("单价") for n in slot_nums)
+        if isinstance(idx, int)
+    ]
+    total = len(slot_nums)
 
     per_brand = {}
     detail_parts = []
+    # 循环内频繁使用的名字绑定为局部变量
+    text, is_filled = cell_text, is_cell_filled
+    brand_stat = per_brand.setdefault
+    add_detail = detail_parts.append
     for i, row in enumerate(sheet_data[1:], start=2):
-        if not isinstance(row, list):
-            continue
-        name = _cell(row, name_col)
-        brand = _cell(row, brand_col)
-        model = _cell(row, model_col)
+        n = len(row)
+        name = text(row[name_col]) if name_col is not None and name_col < n else ""
+        brand = text(row[brand_col]) if brand_col is not None and brand_col < n else ""
+        model = text(row[model_col]) if model_col is not None and model_col < n else ""
         if not name and not brand and not model:
             continue
-        got = sum(1 for n in slot_nums if _has_price(row, n))
-        total = len(slot_nums)
+        got = sum(1 for idx in price_indices if idx < n and is_filled(row[idx]))
         bkey = brand or "未填品牌"
-        stat = per_brand.setdefault(bkey, {"items": 0, "got": 0, "total": 0})
+        stat = brand_stat(bkey, {"items": 0, "got": 0, "total": 0})
         stat["items"] += 1
         stat["got"] += got
         stat["total"] += total
@@ -156,153 +213,184 @@ def get_sheet_state_summary(sheet_data):
         if model:
             base += f" | 型号:{model}"
         base += f" | 已询:{got}/{total}"
-        detail_parts.append(base)
+        add_detail(base)
+        # 明细最多12条，够了就停止扫描；品牌汇总因此只统计前12个有效行，
+        # 对大表是近似值，但避免了为几行摘要遍历整张表
         if len(detail_parts) >= 12:
             break
 
-    brand_parts = []
-    for brand, stat in sorted(per_brand.items(), key=lambda kv: (-kv[1]["items"], kv[0])):
-        brand_parts.append(f"{brand} {stat['items']}项 已询{stat['got']}/{stat['total']}")
-        if len(brand_parts) >= 6:
-            break
+    brand_parts = [
+        f"{brand} {stat['items']}项 已询{stat['got']}/{stat['total']}"
+        for brand, stat in heapq.nsmallest(6, per_brand.items(), key=lambda kv: (-kv[1]["items"], kv[0]))
+    ]
 
     slot_text = f"槽位数:{len(slot_nums)}"
     brand_text = "；".join(brand_parts) if brand_parts else "无"
     detail_text = "；".join(detail_parts) if detail_parts else "无"
     return f"{slot_text} | 品牌汇总:{brand_text} | 明细:{detail_text}"
 
-def get_pending_summary(sheet_data):
+def get_pending_summary(sheet_data, schema=None):
+    """待询价物料摘要。sheet_data 每行均为 list（由 ChatRequest 校验保证）"""
     summary = []
     if not sheet_data or len(sheet_data) < 2:
         return "空"
 
-    schema = build_sheet_schema(sheet_data)
+    if schema is None:
+        schema = build_sheet_schema(sheet_data)
     headers = schema.get("headers") or []
     cols = schema.get("item_columns") or {}
-    name_col = cols.get("name")
-    spec_col = cols.get("spec")
+    # 列下标是否有效与行无关，循环外判断一次；无效列置为 None
+    name_col, spec_col = (
+        c if isinstance(c, int) and c >= 0 else None for c in (cols.get("name"), cols.get("spec"))
+    )
 
     for i, row in enumerate(sheet_data[1:], start=2):
-        if not isinstance(row, list):
-            continue
-        name = row[name_col] if isinstance(name_col, int) and name_col < len(row) else None
-        spec = row[spec_col] if isinstance(spec_col, int) and spec_col < len(row) else None
+        n = len(row)
+        name = row[name_col] if name_col is not None and name_col < n else None
+        spec = row[spec_col] if spec_col is not None and spec_col < n else None
         if name is None and spec is None:
             continue
-        label = str(name) if name is not None else ""
-        spec_text = str(spec) if spec is not None else ""
-        if label.strip() == "" and spec_text.strip() == "":
+        label = name if isinstance(name, str) else ("" if name is None else str(name))
+        spec_text = spec if isinstance(spec, str) else ("" if spec is None else str(spec))
+        has_spec = bool(spec_text.strip())
+        if not has_spec and not label.strip():
             continue
-        if spec_text.strip():
+        if has_spec:
             summary.append(f"行{i}: {label} ({spec_text})")
         else:
             summary.append(f"行{i}: {label}")
-        if i >= 8:
+        if len(summary) >= 8:
             break
     if not summary and headers:
         return "空"
     return "; ".join(summary) if summary else "空"
 
 
-def build_candidate_rows_summary(sheet_data, rows: list) -> str:
+def build_candidate_rows_summary(sheet_data, rows: list, schema=None, max_rows: int = 5) -> str:
+    """候选行摘要。sheet_data 每行均为 list（由 ChatRequest 校验保证）"""
     if not sheet_data or not rows:
         return "无"
-    schema = build_sheet_schema(sheet_data)
+    if schema is None:
+        schema = build_sheet_schema(sheet_data)
     cols = schema.get("item_columns") or {}
-    name_col = cols.get("name")
-    brand_col = cols.get("brand")
-    spec_col = cols.get("spec")
+    # 列下标是否有效与行无关，循环外判断一次
+    name_col, brand_col, spec_col = (
+        c if isinstance(c, int) and c >= 0 else None
+        for c in (cols.get("name"), cols.get("brand"), cols.get("spec"))
+    )
     parts = []
     for r in rows:
         idx = r - 1
         if idx < 1 or idx >= len(sheet_data):
             continue
         row = sheet_data[idx]
-        if not isinstance(row, list):
-            continue
-        name = row[name_col] if isinstance(name_col, int) and name_col < len(row) else ""
-        brand = row[brand_col] if isinstance(brand_col, int) and brand_col < len(row) else ""
-        spec = row[spec_col] if isinstance(spec_col, int) and spec_col < len(row) else ""
+        n = len(row)
+        name = row[name_col] if name_col is not None and name_col < n else ""
+        brand = row[brand_col] if brand_col is not None and brand_col < n else ""
+        spec = row[spec_col] if spec_col is not None and spec_col < n else ""
         text = f"行{r}: {name}"
         if brand:
             text += f" | 品牌: {brand}"
         if spec:
             text += f" | 规格: {spec}"
         parts.append(text)
+        if len(parts) >= max_rows:
+            break
     return "; ".join(parts) if parts else "无"
 
 
-def extract_models_from_message(message: str, sheet_data: list) -> list:
+def _scan_item_columns(sheet_data: list, schema) -> dict:
+    """一次遍历数据行，同时收集品牌集合、型号列表和各品牌所在行号，供品牌/型号提取和上下文构建共用"""
+    cols = schema.get("item_columns") or {}
+    brand_col, model_col = (
+        c if isinstance(c, int) and c >= 0 else None
+        for c in (cols.get("brand"), cols.get("model"))
+    )
+    models = []
+    rows_by_brand = defaultdict(list)
+    for i, row in enumerate(sheet_data[1:], start=2):
+        n = len(row)
+        if brand_col is not None and brand_col < n and row[brand_col]:
+            brand = str(row[brand_col]).strip()
+            if brand:
+                rows_by_brand[brand].append(i)
+        if model_col is not None and model_col < n and row[model_col]:
+            model = str(row[model_col]).strip()
+            if model:
+                models.append(model)
+    return {"brands": set(rows_by_brand), "models": models, "rows_by_brand": rows_by_brand}
+
+
+def extract_models_from_message(message: str, sheet_data: list, schema=None, scan=None) -> list:
     """从用户消息中提取可能的型号"""
     if not message or not sheet_data or len(sheet_data) < 2:
         return []
 
     # 获取表格中所有的型号
-    schema = build_sheet_schema(sheet_data)
-    cols = schema.get("item_columns") or {}
-    model_col = cols.get("model")
-
-    if not isinstance(model_col, int):
+    if scan is None:
+        if schema is None:
+            schema = build_sheet_schema(sheet_data)
+        scan = _scan_item_columns(sheet_data, schema)
+    table_models = scan["models"]
+    if not table_models:
         return []
 
-    # 提取表格中的所有型号
-    table_models = []
-    for row in sheet_data[1:]:
-        if isinstance(row, list) and model_col < len(row):
-            model = row[model_col]
-            if model and str(model).strip():
-                table_models.append(str(model).strip())
+    # 重复型号只需比较一次；标准化后的集合用于精确命中快速判断
+    table_models = list(dict.fromkeys(table_models))
+    table_model_norms = {normalize_header(m) for m in table_models}
 
     # 从消息中查找可能的型号（使用模糊匹配）
     potential_models = []
-    words = re.split(r'[\s,，、]+', message)
+    words = _TOKEN_SPLIT_RE.split(message)
 
     for word in words:
         word = word.strip()
         if not word or len(word) < 3:
             continue
+        if word in potential_models:
+            continue
+        # 标准化后与表格型号完全一致（相似度 100），不必逐个模糊比较
+        if normalize_header(word) in table_model_norms:
+            potential_models.append(word)
+            continue
         # 检查是否与表格中的型号相似
         for table_model in table_models:
-            from ..services.sheet_schema import fuzzy_match_score
             score = fuzzy_match_score(word, table_model)
             if score >= 70:  # 相似度阈值
-                if word not in potential_models:
-                    potential_models.append(word)
+                potential_models.append(word)
                 break
 
     return potential_models
 
 
-def extract_brand_from_message(message: str, sheet_data: list) -> Optional[str]:
+def extract_brand_from_message(message: str, sheet_data: list, schema=None, scan=None) -> Optional[str]:
     """从用户消息中提取品牌"""
     if not message or not sheet_data or len(sheet_data) < 2:
         return None
 
     # 获取表格中所有的品牌
-    schema = build_sheet_schema(sheet_data)
-    cols = schema.get("item_columns") or {}
-    brand_col = cols.get("brand")
-
-    if not isinstance(brand_col, int):
+    if scan is None:
+        if schema is None:
+            schema = build_sheet_schema(sheet_data)
+        scan = _scan_item_columns(sheet_data, schema)
+    table_brands = scan["brands"]
+    if not table_brands:
         return None
 
-    # 提取表格中的所有品牌
-    table_brands = set()
-    for row in sheet_data[1:]:
-        if isinstance(row, list) and brand_col < len(row):
-            brand = row[brand_col]
-            if brand and str(brand).strip():
-                table_brands.add(str(brand).strip())
-
-    # 从消息中查找品牌
-    for brand in table_brands:
-        if brand in message:
-            return brand
+    # 按品牌长度切出消息的所有子串，与品牌集合求交集，不再对每个品牌做一次子串搜索；
+    # 长品牌优先（"西门子PLC" 优先于 "西门子"），同样长度取消息中最先出现的
+    msg_len = len(message)
+    for length in sorted({len(b) for b in table_brands}, reverse=True):
+        if length > msg_len:
+            continue
+        hits = table_brands.intersection(message[i:i + length] for i in range(msg_len - length + 1))
+        if hits:
+            return min(hits, key=message.find)
 
     return None
 
 
-def build_smart_context(message: str, sheet_data: list, max_rows: int = 50) -> dict:
+def build_smart_context(message: str, sheet_data: list, max_rows: int = 50, schema=None) -> dict:
     """
     构建智能上下文注入数据
 
@@ -310,6 +398,7 @@ def build_smart_context(message: str, sheet_data: list, max_rows: int = 50) -> d
         message: 用户消息
         sheet_data: 表格数据
         max_rows: 最多注入的行数
+        schema: 调用方已构建的表格结构，传入可避免重复构建
 
     Returns:
         包含品牌上下文和相关产品列表的字典
@@ -317,50 +406,64 @@ def build_smart_context(message: str, sheet_data: list, max_rows: int = 50) -> d
     if not sheet_data or len(sheet_data) < 2:
         return {"brand_context": None, "relevant_rows": [], "total_matched": 0}
 
-    # 1. 提取品牌和型号
-    brand_context = extract_brand_from_message(message, sheet_data)
-    potential_models = extract_models_from_message(message, sheet_data)
+    if schema is None:
+        schema = build_sheet_schema(sheet_data)
+
+    # 1. 提取品牌和型号（共用一次表格遍历的结果）
+    scan = _scan_item_columns(sheet_data, schema)
+    brand_context = extract_brand_from_message(message, sheet_data, scan=scan)
+    potential_models = extract_models_from_message(message, sheet_data, scan=scan)
 
     # 2. 使用模糊匹配找到相关行
     relevant_rows_dict = {}  # 使用字典去重，key为行号
 
-    # 2.1 根据提取的型号进行模糊匹配
-    for model in potential_models:
-        matches = fuzzy_match_rows(
-            sheet_data,
-            model,
-            brand_filter=brand_context,
-            threshold=75.0,  # 降低阈值以支持更多变体
-            max_results=10
-        )
+    # 2.1 根据提取的型号进行模糊匹配（所有型号一次扫描表格）
+    # 识别到品牌时，先按品牌取值筛出候选行（每个不同品牌只比较一次），只对候选行做型号模糊匹配
+    candidate_rows = None
+    if brand_context and potential_models:
+        rows_by_brand = scan["rows_by_brand"]
+        candidate_rows = [
+            i
+            for brand in rows_by_brand
+            if fuzzy_match_score(brand_context, brand) >= BRAND_MATCH_THRESHOLD
+            for i in rows_by_brand[brand]
+        ]
+    matches_per_model = fuzzy_match_rows_batch(
+        sheet_data,
+        potential_models,
+        brand_filter=brand_context,
+        threshold=75.0,  # 降低阈值以支持更多变体
+        max_results=10,
+        row_indices=candidate_rows,
+    )
+    for matches in matches_per_model:
         for match in matches:
             row_num = match["row"]
             if row_num not in relevant_rows_dict:
                 relevant_rows_dict[row_num] = match
 
-    # 2.2 如果识别到品牌，补充该品牌的所有产品
+    # 2.2 如果识别到品牌，补充该品牌的所有产品（行号已在遍历时按品牌分组）
     if brand_context:
-        schema = build_sheet_schema(sheet_data)
         cols = schema.get("item_columns") or {}
-        brand_col = cols.get("brand")
-
-        if isinstance(brand_col, int):
-            for i, row in enumerate(sheet_data[1:], start=2):
-                if not isinstance(row, list) or brand_col >= len(row):
-                    continue
-                row_brand = row[brand_col]
-                if row_brand and str(row_brand).strip() == brand_context:
-                    if i not in relevant_rows_dict:
-                        # 添加该品牌的产品
-                        relevant_rows_dict[i] = {
-                            "row": i,
-                            "score": 100.0,  # 品牌匹配给高分
-                            "match_field": "品牌",
-                            "name": row[cols.get("name")] if isinstance(cols.get("name"), int) and cols.get("name") < len(row) else None,
-                            "brand": brand_context,
-                            "model": row[cols.get("model")] if isinstance(cols.get("model"), int) and cols.get("model") < len(row) else None,
-                            "spec": row[cols.get("spec")] if isinstance(cols.get("spec"), int) and cols.get("spec") < len(row) else None,
-                        }
+        name_col, model_col, spec_col = (
+            c if isinstance(c, int) and c >= 0 else None
+            for c in (cols.get("name"), cols.get("model"), cols.get("spec"))
+        )
+        for i in scan["rows_by_brand"].get(brand_context, ()):
+            if i in relevant_rows_dict:
+                continue
+            row = sheet_data[i - 1]
+            n = len(row)
+            # 添加该品牌的产品
+            relevant_rows_dict[i] = {
+                "row": i,
+                "score": 100.0,  # 品牌匹配给高分
+                "match_field": "品牌",
+                "name": row[name_col] if name_col is not None and name_col < n else None,
+                "brand": brand_context,
+                "model": row[model_col] if model_col is not None and model_col < n else None,
+                "spec": row[spec_col] if spec_col is not None and spec_col < n else None,
+            }
 
     # 3. 转换为列表并排序
     relevant_rows = list(relevant_rows_dict.values())
@@ -381,9 +484,9 @@ def build_history_messages(chat_history, max_messages: int = 12, max_chars_per_m
         return None
 
     items = []
-    for m in chat_history:
-        role = getattr(m, "role", None)
-        content = getattr(m, "content", None)
+    # 从最新的消息往前取，凑够 max_messages 条有效消息即停止
+    for m in reversed(chat_history):
+        role, content = m.role, m.content
         if role not in ("user", "assistant"):
             continue
         if not isinstance(content, str):
@@ -394,11 +497,44 @@ def build_history_messages(chat_history, max_messages: int = 12, max_chars_per_m
         if len(c) > max_chars_per_message:
             c = c[:max_chars_per_message]
         items.append({"role": role, "content": c})
+        if len(items) >= max_messages:
+            break
 
     if not items:
         return None
 
-    return items[-max_messages:]
+    items.reverse()
+    return items
+
+# 写入报价的必填字段，各占一位；每次请求先把 required_fields 折算成掩码
+_REQUIRED_FIELD_BITS = {"单价": 1, "含税": 2, "含运": 4, "货期": 8}
+
+
+def _required_mask(required_fields) -> int:
+    return sum(bit for name, bit in _REQUIRED_FIELD_BITS.items() if name in required_fields)
+
+
+def _missing_update_fields(data_dict: dict, required_mask: int) -> List[str]:
+    """检查写入报价前必须提供的字段，返回缺失项名称"""
+    price = data_dict.get("price")
+    present = (
+        (1 if (price or price == 0) else 0)
+        | (2 if "tax" in data_dict else 0)
+        | (4 if "shipping" in data_dict else 0)
+        | (8 if data_dict.get("delivery_time") else 0)
+    )
+    missing_mask = required_mask & ~present
+    missing = [name for name, bit in _REQUIRED_FIELD_BITS.items() if missing_mask & bit] if missing_mask else []
+    if not data_dict.get("target_row"):
+        missing.append("行号/物料名称")
+    return missing
+
+
+def _format_supplier(s) -> str:
+    """供应商记录拼成单元格字符串：公司 联系人 电话"""
+    parts = ((p or "").strip() for p in (s.company_name, s.contact_name, s.contact_phone))
+    return " ".join(p for p in parts if p)
+
 
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -406,41 +542,50 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db), cur
     schema = build_sheet_schema(sheet_data)
     headers = schema.get("headers") or []
     headers_preview = [str(h) for h in headers[:40]]
-    writable_fields_json = json.dumps(build_writable_fields(schema), ensure_ascii=False)
+    writable_fields_json = json_utils.dumps(build_writable_fields(schema))
 
     required_fields = []
     slots = schema.get("slots") or {}
-    slot_num = sorted(slots.keys())[0] if slots else None
+    # 只用到前3个槽位；schema 已带排好序的槽位号
+    slot_nums = (schema.get("slot_nums") or [])[:3]
+    slot_num = slot_nums[0] if slot_nums else None
     if slot_num is not None:
         required_fields = [k for k in ("单价", "含税", "含运", "货期") if k in slots.get(slot_num, {})]
     else:
         required_fields = ["单价", "含税", "含运", "货期"]
 
-    has_price_col = any("单价" in (slot or {}) for slot in (slots.values() if isinstance(slots, dict) else []))
+    # 固定位置模式下每个槽位字段齐全，只需检查第一个槽位
+    has_price_col = slot_num is not None and "单价" in (slots.get(slot_num) or {})
     if not has_price_col:
         return ChatResponse(action="ASK", content="当前表格未检测到可写入的报价列（例如：单价1/是否含税1/是否含运1/货期1）。请上传包含报价列的询价表，或调整表头命名。")
 
-    # 使用智能上下文注入
-    smart_context = build_smart_context(request.message, sheet_data, max_rows=50)
+    def _prepare_context():
+        # 使用智能上下文注入
+        ctx = build_smart_context(request.message, sheet_data, max_rows=50, schema=schema)
+        return (
+            ctx,
+            get_pending_summary(sheet_data, schema=schema),
+            get_sheet_state_summary(sheet_data, schema=schema),
+        )
 
-    summary = get_pending_summary(sheet_data)
-    sheet_state_summary = get_sheet_state_summary(sheet_data)
+    # 模糊匹配和摘要都要整表扫描，放到线程池执行，大表时不阻塞其他请求
+    smart_context, summary, sheet_state_summary = await asyncio.to_thread(_prepare_context)
     history_messages = build_history_messages(request.chat_history)
 
     # 构建相关行的详细信息（用于注入给AI）
+    # 槽位价格列与行无关，只取一次（最多3个槽位）
+    status_price_cols = [(n, (slots.get(n) or {}).get("单价")) for n in slot_nums]
     relevant_rows_detail = []
     for row_info in smart_context["relevant_rows"]:
         # 获取该行的报价槽位状态
         row_num = row_info["row"]
         slot_status = []
-        for slot_num in sorted(slots.keys())[:3]:  # 最多3个槽位
-            slot_map = slots.get(slot_num) or {}
-            price_idx = slot_map.get("单价")
+        for slot_num, price_idx in status_price_cols:
             if isinstance(price_idx, int) and row_num - 1 < len(sheet_data):
                 row_data = sheet_data[row_num - 1]
                 if isinstance(row_data, list) and price_idx < len(row_data):
                     price_val = row_data[price_idx]
-                    has_price = price_val is not None and str(price_val).strip() not in ("", "none", "None")
+                    has_price = is_cell_filled(price_val)
                     slot_status.append(f"槽位{slot_num}{'已填' if has_price else '空'}")
 
         relevant_rows_detail.append({
@@ -457,14 +602,37 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db), cur
     context = {
         "sheet_state_summary": sheet_state_summary,
         "pending_items_summary": summary,
-        "headers_preview_json": json.dumps(headers_preview, ensure_ascii=False),
+        "headers_preview_json": json_utils.dumps(headers_preview),
         "writable_fields_json": writable_fields_json,
-        "required_fields_json": json.dumps(required_fields, ensure_ascii=False),
+        "required_fields_json": json_utils.dumps(required_fields),
         "brand_context": smart_context["brand_context"] or "未识别",
-        "relevant_rows_json": json.dumps(relevant_rows_detail, ensure_ascii=False),
+        "relevant_rows_json": json_utils.dumps(relevant_rows_detail),
         "total_relevant_rows": smart_context["total_matched"],
     }
 
+    # 同一请求内按名称缓存供应商查询结果（工具调用和批量写入常查同一个人）
+    supplier_cache: dict = {}
+    # 工具可能在多个线程中并发执行，Session 不是线程安全的，查询需串行
+    db_lock = threading.Lock()
+
+    def _lookup_supplier_string(name: str) -> Optional[str]:
+        key = name.strip()
+        if not key:
+            return None
+        if key in supplier_cache:
+            return supplier_cache[key]
+        try:
+            with db_lock:
+                supplier_service = SupplierService(db)
+                results = supplier_service.search_suppliers(key, limit=1)
+        except SQLAlchemyError:
+            # 数据库故障不等于"查无此供应商"：记错误日志，不写入缓存，本次按未找到处理
+            logger.error("Supplier lookup failed for %r", key, exc_info=True)
+            return None
+        supplier = _format_supplier(results[0]) if results else None
+        supplier_cache[key] = supplier or None
+        return supplier_cache[key]
+
     tools = ToolRegistry()
 
     def _locate_row(args: dict) -> dict:
@@ -497,22 +665,7 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db), cur
         if not isinstance(name, str) or not name.strip():
             return {"supplier": None}
 
-        # Search database for supplier
-        try:
-            supplier_service = SupplierService(db)
-            results = supplier_service.search_suppliers(name.strip(), limit=1)
-            if results:
-                s = results[0]
-                supplier = " ".join([
-                    s.company_name or "",
-                    s.contact_name or "",
-                    s.contact_phone or ""
-                ]).strip()
-                return {"supplier": supplier or None}
-        except Exception as e:
-            print(f"Supplier lookup error: {e}")
-
-        return {"supplier": None}
+        return {"supplier": _lookup_supplier_string(name)}
 
     def _web_search_supplier(args: dict) -> dict:
         """网络搜索品牌的供应商信息"""
@@ -716,15 +869,17 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db), cur
     for tool_name in enabled_tools:
         if tool_name in all_tools:
             spec, fn = all_tools[tool_name]
-            tools.register(tool_name, spec, fn)
+            # 迭代式浏览器工具共享同一个会话，必须按顺序执行
+            tools.register(tool_name, spec, fn, parallel_safe=not tool_name.startswith("browser_"))
 
-    # 调试日志
-    import logging
-    logging.warning(f"[DEBUG] 已注册工具: {[t['name'] for t in tools.describe()]}")
-    logging.warning(f"[DEBUG] 用户消息: {request.message}")
+    # 调试日志（默认 INFO 级别下不格式化）
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("已注册工具: %s", [t["name"] for t in tools.describe()])
+        logger.debug("用户消息: %s", request.message)
 
-    agent_out = run_two_stage_agent(
-        call_llm=call_llm,
+    # LLM 调用走异步客户端；同步工具由 agent 内部放到线程中执行
+    agent_out = await run_two_stage_agent(
+        call_llm=acall_llm,
         user_message=request.message,
         history_messages=history_messages,
         context=context,
@@ -735,69 +890,57 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db), cur
     if agent_out.get("action") == "ASK":
         return ChatResponse(action="ASK", content=agent_out.get("content") or "请提供更多信息")
 
+    def _to_update_action(data_dict: dict) -> UpdateAction:
+        """按需补全供应商后构造 UpdateAction（数值/是否含税等由模型校验解析）"""
+        lookup_name = data_dict.get("lookup_supplier")
+        if lookup_name and not data_dict.get("supplier"):
+            # 尝试从数据库查找供应商
+            supplier_info = _lookup_supplier_string(str(lookup_name))
+            if supplier_info:
+                data_dict["supplier"] = supplier_info
+
+        cleaned = {k: v for k, v in data_dict.items() if k in _UPDATE_ACTION_FIELDS}
+        return UpdateAction(**cleaned)
+
     if agent_out.get("action") == "WRITE":
         updates = agent_out.get("updates")
         if isinstance(updates, list):
             if not updates:
                 return ChatResponse(action="ASK", content="LLM未返回可执行的更新列表")
 
-            current_sheet = sheet_data
-            updated_rows = []
+            pending = []
+            # 与单条更新无关的量在循环外算一次
+            explicit_row = extract_row_from_message(request.message)
+            required_mask = _required_mask(required_fields)
             for item in updates[:50]:
                 if not isinstance(item, dict):
                     continue
                 data_dict = dict(item)
 
-                explicit_row = extract_row_from_message(request.message)
                 if not data_dict.get("target_row") and explicit_row:
                     data_dict["target_row"] = explicit_row
 
-                missing = []
-                required = set(required_fields)
-                if "单价" in required and (not data_dict.get("price") and data_dict.get("price") != 0):
-                    missing.append("单价")
-                if "含税" in required and "tax" not in data_dict:
-                    missing.append("含税")
-                if "含运" in required and "shipping" not in data_dict:
-                    missing.append("含运")
-                if "货期" in required and not data_dict.get("delivery_time"):
-                    missing.append("货期")
-                if not data_dict.get("target_row"):
-                    missing.append("行号/物料名称")
+                missing = _missing_update_fields(data_dict, required_mask)
                 if missing:
                     return ChatResponse(action="ASK", content=f"请补充：{', '.join(missing)}")
+                pending.append(data_dict)
 
-                lookup_name = data_dict.get("lookup_supplier")
-                if lookup_name and not data_dict.get("supplier"):
-                    # 尝试从数据库查找供应商
-                    try:
-                        supplier_service = SupplierService(db)
-                        results = supplier_service.search_suppliers(str(lookup_name).strip(), limit=1)
-                        if results:
-                            s = results[0]
-                            supplier_info = " ".join([
-                                s.company_name or "",
-                                s.contact_name or "",
-                                s.contact_phone or ""
-                            ]).strip()
-                            if supplier_info:
-                                data_dict["supplier"] = supplier_info
-                    except Exception as e:
-                        print(f"Supplier lookup failed: {e}")
-
-                field_names = getattr(UpdateAction, "model_fields", None)
-                if isinstance(field_names, dict):
-                    allowed = set(field_names.keys())
-                else:
-                    allowed = set(getattr(UpdateAction, "__fields__", {}).keys())
-                cleaned = {k: v for k, v in data_dict.items() if k in allowed}
-                update_action = UpdateAction(**cleaned)
-                current_sheet = process_update(current_sheet, update_action)
-                updated_rows.append(update_action.target_row)
-
-            if not updated_rows:
+            if not pending:
                 return ChatResponse(action="ASK", content="更新列表中没有可执行的更新项")
 
+            def _apply_pending():
+                actions = [_to_update_action(d) for d in pending]
+                # 所有更新校验通过后一次性写入，schema 只构建一次
+                return actions, process_updates(sheet_data, actions)
+
+            try:
+                # 供应商查询（数据库）和整表写入都是阻塞操作，放到线程池执行
+                actions, current_sheet = await asyncio.to_thread(_apply_pending)
+            except Exception as e:
+                return ChatResponse(action="ASK", content=f"更新表格失败: {str(e)}")
+            # 同一行可能有多条报价，提示里去重并按行号排序
+            updated_rows = sorted({a.target_row for a in actions})
+
             # 检查缺失字段并生成提醒
             missing_fields = set()
             for data_dict in updates:
@@ -860,48 +1003,17 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db), cur
                     tip = "；".join(lines) if lines else "存在多个候选行"
                     return ChatResponse(action="ASK", content=f"匹配到多个候选，请指定第X行或补充型号/规格：{tip}")
 
-        missing = []
-        required = set(required_fields)
-        if "单价" in required and (not data_dict.get("price") and data_dict.get("price") != 0):
-            missing.append("单价")
-        if "含税" in required and "tax" not in data_dict:
-            missing.append("含税")
-        if "含运" in required and "shipping" not in data_dict:
-            missing.append("含运")
-        if "货期" in required and not data_dict.get("delivery_time"):
-            missing.append("货期")
-        if not data_dict.get("target_row"):
-            missing.append("行号/物料名称")
+        missing = _missing_update_fields(data_dict, _required_mask(required_fields))
         if missing:
             return ChatResponse(action="ASK", content=f"请补充：{', '.join(missing)}")
-        
+
         try:
-            lookup_name = data_dict.get("lookup_supplier")
-            if lookup_name and not data_dict.get("supplier"):
-                # 尝试从数据库查找供应商
-                try:
-                    supplier_service = SupplierService(db)
-                    results = supplier_service.search_suppliers(str(lookup_name).strip(), limit=1)
-                    if results:
-                        s = results[0]
-                        supplier_info = " ".join([
-                            s.company_name or "",
-                            s.contact_name or "",
-                            s.contact_phone or ""
-                        ]).strip()
-                        if supplier_info:
-                            data_dict["supplier"] = supplier_info
-                except Exception as e:
-                    print(f"Supplier lookup failed: {e}")
+            def _apply_one():
+                action = _to_update_action(data_dict)
+                return action, process_update(sheet_data, action)
 
-            field_names = getattr(UpdateAction, "model_fields", None)
-            if isinstance(field_names, dict):
-                allowed = set(field_names.keys())
-            else:
-                allowed = set(getattr(UpdateAction, "__fields__", {}).keys())
-            cleaned = {k: v for k, v in data_dict.items() if k in allowed}
-            update_action = UpdateAction(**cleaned)
-            new_sheet = process_update(sheet_data, update_action)
+            # 供应商查询（数据库）和整表写入都是阻塞操作，放到线程池执行
+            update_action, new_sheet = await asyncio.to_thread(_apply_one)
 
             # 检查缺失字段并生成提醒
             missing_fields = []
@@ -927,6 +1039,46 @@ async def chat_endpoint(request: ChatRequest, db: Session = Depends(get_db), cur
 
     return ChatResponse(action="ASK", content="未知指令")
 
+# 批量对话单次最多处理的消息数
+MAX_BATCH_MESSAGES = 20
+
+
+@router.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch_endpoint(request: BatchChatRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """
+    一次提交多条消息（如粘贴的多条报价），省去逐条往返
+
+    消息按顺序处理：后一条基于前一条写入后的表格，并带上前面的对话作为历史。
+    服务端只是逐条调用 chat_endpoint 的顺序循环：schema 按表头缓存复用，
+    表格摘要和智能上下文每条消息都会重新计算（上一条可能已改写表格）。
+    """
+    if len(request.messages) > MAX_BATCH_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"单次最多 {MAX_BATCH_MESSAGES} 条消息")
+
+    sheet_data = request.current_sheet_data or []
+    history = list(request.chat_history or [])
+    results: List[ChatResponse] = []
+    updated_sheet = None
+
+    for message in request.messages:
+        response = await chat_endpoint(
+            ChatRequest(
+                message=message,
+                current_sheet_data=sheet_data,
+                chat_history=history,
+                enabled_tools=request.enabled_tools,
+            ),
+            db=db,
+            current_user=current_user,
+        )
+        results.append(response)
+        if response.updated_sheet is not None:
+            sheet_data = updated_sheet = response.updated_sheet
+        history.append(ChatHistoryMessage(role="user", content=message))
+        history.append(ChatHistoryMessage(role="assistant", content=response.content or ""))
+
+    return BatchChatResponse(results=results, updated_sheet=updated_sheet)
+
 # 文件上传大小限制 (10MB)
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024
 ALLOWED_MIME_TYPES = [
@@ -934,6 +1086,71 @@ ALLOWED_MIME_TYPES = [
     "application/vnd.ms-excel",  # xls
 ]
 
+# 2**53 以内的整数 float 能精确表示
+_FLOAT_EXACT_INT_LIMIT = 2 ** 53
+
+
+def _parse_excel(fileobj) -> list:
+    """把上传的Excel（文件对象）解析为二维列表，第一行为表头"""
+    # calamine (Rust) reads cell values only and also handles legacy .xls;
+    # read the first sheet straight into lists, no DataFrame in between.
+    # skip_empty_area=False keeps leading blank rows/columns so positions
+    # match the workbook (the schema is position based)
+    sheet = CalamineWorkbook.from_filelike(fileobj).get_sheet_by_index(0)
+    rows = sheet.to_python(skip_empty_area=False)
+
+    # Excel stores every number as float; give whole numbers back as int
+    # (quantities, codes) like openpyxl does. Blank cells are already "".
+    # Only below 2**53, where a float still holds the exact integer: longer
+    # numeric codes stay float, so no >64-bit ints reach the JSON encoders
+    for row in rows:
+        for j, v in enumerate(row):
+            if type(v) is float and v.is_integer() and abs(v) < _FLOAT_EXACT_INT_LIMIT:
+                row[j] = int(v)
+
+    return rows
+
+
+def _recommend_suppliers(db: Session, result_data: list) -> list:
+    """根据表格中的品牌推荐已有供应商（同步DB查询，在线程池中调用）"""
+    recommended_suppliers = []
+    schema = build_sheet_schema(result_data)
+    cols = schema.get("item_columns") or {}
+    brand_col = cols.get("brand")
+
+    # Collect unique brands（列有效性循环外判断一次；产品名称不参与推荐，不再收集）
+    brands = set()
+    if isinstance(brand_col, int):
+        is_filled = is_cell_filled
+        brands = {
+            str(brand).strip()
+            for row in result_data[1:]  # Skip header row
+            if isinstance(row, list) and brand_col < len(row) and is_filled(brand := row[brand_col])
+        }
+
+    # Search suppliers by brands
+    supplier_service = SupplierService(db)
+    seen_suppliers = set()
+
+    # Search by brands (one query for all brands)
+    matches_by_brand = supplier_service.search_suppliers_bulk(list(brands), per_term_limit=3)
+    for brand, results in matches_by_brand.items():
+        for supplier in results:
+            if supplier.id not in seen_suppliers:
+                seen_suppliers.add(supplier.id)
+                recommended_suppliers.append({
+                    "company_name": supplier.company_name,
+                    "contact_name": supplier.contact_name,
+                    "contact_phone": supplier.contact_phone,
+                    "match_reason": f"品牌匹配: {brand}",
+                    "quote_count": supplier.quote_count,
+                    "last_quote_date": supplier.last_quote_date.isoformat() if supplier.last_quote_date else None
+                })
+
+    # Limit to top 10 recommendations
+    return recommended_suppliers[:10]
+
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
@@ -949,73 +1166,20 @@ async def upload_file(
         raise HTTPException(status_code=400, detail="文件类型不正确，请上传 Excel 文件")
 
     try:
-        # 读取文件并检查大小
-        contents = await file.read()
-        if len(contents) > MAX_UPLOAD_SIZE:
+        # 检查大小：UploadFile 底层是临时文件，直接定位到末尾取长度，不整体读入内存
+        file.file.seek(0, io.SEEK_END)
+        if file.file.tell() > MAX_UPLOAD_SIZE:
             raise HTTPException(status_code=400, detail="文件大小超过限制 (最大 10MB)")
+        file.file.seek(0)
 
-        df = pd.read_excel(io.BytesIO(contents))
-
-        # Replace NaN with empty string
-        df = df.fillna("")
-
-        # Convert to list of lists
-        # Include headers as the first row
-        headers = df.columns.tolist()
-        data = df.values.tolist()
-
-        result_data = [headers] + data
+        # 解析是同步的CPU/IO操作，放到线程池里执行，避免阻塞事件循环
+        result_data = await asyncio.to_thread(_parse_excel, file.file)
 
         # Analyze and recommend suppliers based on brands and product names
         recommended_suppliers = []
         try:
-            schema = build_sheet_schema(result_data)
-            cols = schema.get("item_columns") or {}
-            brand_col = cols.get("brand")
-            name_col = cols.get("name")
-
-            # Collect unique brands and product names
-            brands = set()
-            product_names = set()
-
-            for row in result_data[1:]:  # Skip header row
-                if not isinstance(row, list):
-                    continue
-
-                # Extract brand
-                if isinstance(brand_col, int) and brand_col < len(row):
-                    brand = row[brand_col]
-                    if brand and str(brand).strip() and str(brand).strip().lower() != "none":
-                        brands.add(str(brand).strip())
-
-                # Extract product name
-                if isinstance(name_col, int) and name_col < len(row):
-                    name = row[name_col]
-                    if name and str(name).strip() and str(name).strip().lower() != "none":
-                        product_names.add(str(name).strip())
-
-            # Search suppliers by brands and product names
-            supplier_service = SupplierService(db)
-            seen_suppliers = set()
-
-            # Search by brands
-            for brand in brands:
-                results = supplier_service.search_suppliers(brand, limit=3)
-                for supplier in results:
-                    if supplier.id not in seen_suppliers:
-                        seen_suppliers.add(supplier.id)
-                        recommended_suppliers.append({
-                            "company_name": supplier.company_name,
-                            "contact_name": supplier.contact_name,
-                            "contact_phone": supplier.contact_phone,
-                            "match_reason": f"品牌匹配: {brand}",
-                            "quote_count": supplier.quote_count,
-                            "last_quote_date": supplier.last_quote_date.isoformat() if supplier.last_quote_date else None
-                        })
-
-            # Limit to top 10 recommendations
-            recommended_suppliers = recommended_suppliers[:10]
-
+            # 供应商查询是同步DB调用，同样放到线程池，不阻塞事件循环
+            recommended_suppliers = await asyncio.to_thread(_recommend_suppliers, db, result_data)
         except Exception as e:
             print(f"Failed to analyze suppliers: {e}")
             # Don't fail the upload if supplier analysis fails
@@ -1025,8 +1189,12 @@ async def upload_file(
             "recommended_suppliers": recommended_suppliers
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process file: {str(e)}")
+    finally:
+        await file.close()
 
 
 @router.post("/sheets/save")
@@ -1041,28 +1209,8 @@ async def save_sheet(
         sheet_id = request.id or str(uuid.uuid4())
 
         # Calculate metadata
-        schema = build_sheet_schema(request.sheet_data)
-        slots = schema.get("slots") or {}
-        slot_count = len(slots)
-
         item_count = len(request.sheet_data) - 1 if len(request.sheet_data) > 1 else 0
-
-        # Calculate completion rate
-        total_cells = item_count * slot_count
-        filled_cells = 0
-
-        if total_cells > 0:
-            for row in request.sheet_data[1:]:
-                if isinstance(row, list):
-                    for slot_num in slots.keys():
-                        slot_map = slots.get(slot_num) or {}
-                        price_idx = slot_map.get("单价")
-                        if isinstance(price_idx, int) and price_idx < len(row):
-                            val = row[price_idx]
-                            if val and str(val).strip() and str(val).strip().lower() != "none":
-                                filled_cells += 1
-
-        completion_rate = filled_cells / total_cells if total_cells > 0 else 0.0
+        completion_rate = compute_completion_rate(request.sheet_data)
 
         # Save to database
         db_service = DBService(db)
@@ -1086,30 +1234,66 @@ async def save_sheet(
         raise HTTPException(status_code=500, detail=f"Failed to save sheet: {str(e)}")
 
 
+def _encode_sheet_cursor(sort_at: datetime, sheet_id: str) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([sort_at.isoformat(), sheet_id])).decode()
+
+
+def _decode_sheet_cursor(cursor: str) -> tuple:
+    """解析询价单列表游标为 (sort_at, id)，格式不对时抛出 ValueError"""
+    try:
+        sort_at, sheet_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        sort_at = datetime.fromisoformat(sort_at)
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(sheet_id, str):
+        raise ValueError("invalid cursor")
+    return sort_at, sheet_id
+
+
 @router.get("/sheets/list")
 async def list_sheets(
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get list of saved inquiry sheets"""
+    """Get list of saved inquiry sheets; pass the previous page's next_cursor to page by key instead of offset"""
+    after = None
+    if cursor:
+        try:
+            after = _decode_sheet_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+
     try:
         db_service = DBService(db)
-        sheets = db_service.list_sheets(user_id=current_user.id, limit=limit, offset=offset)
+        # 只查列表需要的列，不加载 sheet_data / chat_history 大字段
+        sheets = db_service.list_sheet_summaries(user_id=current_user.id, limit=limit, offset=offset, after=after)
+        # total 为该用户的询价单总数，而不是本页行数
+        total = db_service.count_sheets(user_id=current_user.id)
 
-        result = []
-        for sheet in sheets:
-            result.append({
+        result = [
+            {
                 "id": sheet.id,
                 "name": sheet.name,
                 "item_count": sheet.item_count,
                 "completion_rate": sheet.completion_rate,
                 "created_at": sheet.created_at.isoformat() + "Z" if sheet.created_at else "",
                 "updated_at": sheet.updated_at.isoformat() + "Z" if sheet.updated_at else ""
-            })
+            }
+            for sheet in sheets
+        ]
+
+        next_cursor = None
+        if sheets and len(sheets) >= limit:
+            # 游标取排序键 sort_at（非空），而不是可能为空的 updated_at
+            next_cursor = _encode_sheet_cursor(sheets[-1].sort_at, sheets[-1].id)
 
-        return {"sheets": result, "total": len(result)}
+        return Response(
+            content=orjson.dumps({"sheets": result, "total": total, "next_cursor": next_cursor}),
+            media_type="application/json",
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to list sheets: {str(e)}")
@@ -1129,16 +1313,21 @@ async def get_sheet(
         if not sheet:
             raise HTTPException(status_code=404, detail="Sheet not found")
 
-        return {
-            "id": sheet.id,
-            "name": sheet.name,
-            "sheet_data": sheet.sheet_data,
-            "chat_history": sheet.chat_history,
-            "item_count": sheet.item_count,
-            "completion_rate": sheet.completion_rate,
-            "created_at": sheet.created_at.isoformat() if sheet.created_at else "",
-            "updated_at": sheet.updated_at.isoformat() if sheet.updated_at else ""
-        }
+        # sheet_data 可能有上万个单元格，用 orjson 直接编码，跳过 jsonable_encoder 的逐值遍历；
+        # 单元格里有超出 64 位的长数字编码时 json_utils 回退到标准库 json
+        return Response(
+            content=json_utils.dumps_bytes({
+                "id": sheet.id,
+                "name": sheet.name,
+                "sheet_data": sheet.sheet_data,
+                "chat_history": sheet.chat_history,
+                "item_count": sheet.item_count,
+                "completion_rate": sheet.completion_rate,
+                "created_at": sheet.created_at.isoformat() if sheet.created_at else "",
+                "updated_at": sheet.updated_at.isoformat() if sheet.updated_at else ""
+            }),
+            media_type="application/json",
+        )
 
     except HTTPException:
         raise
@@ -1168,6 +1357,18 @@ async def delete_sheet(
         raise HTTPException(status_code=500, detail=f"Failed to delete sheet: {str(e)}")
 
 
+def _build_export_file(sheet_data, filename: str) -> str:
+    """生成Excel写入磁盘临时文件，返回路径；由调用方在响应发送后删除"""
+    output = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+    try:
+        with output:
+            export_sheet_to_excel(sheet_data, filename, output=output)
+    except Exception:
+        os.unlink(output.name)
+        raise
+    return output.name
+
+
 @router.get("/sheets/{sheet_id}/export")
 async def export_sheet(
     sheet_id: str,
@@ -1182,19 +1383,20 @@ async def export_sheet(
         if not sheet:
             raise HTTPException(status_code=404, detail="Sheet not found")
 
-        # Generate Excel file (returns BytesIO)
-        excel_file = export_sheet_to_excel(sheet.sheet_data, f"{sheet.name}.xlsx")
+        # 在线程池中生成Excel并落盘，避免整个文件常驻内存
+        export_path = await asyncio.to_thread(_build_export_file, sheet.sheet_data, f"{sheet.name}.xlsx")
 
         # Encode filename for Content-Disposition header (RFC 5987)
         encoded_filename = quote(f"{sheet.name}.xlsx")
 
-        # Return as streaming response
-        return StreamingResponse(
-            excel_file,
+        # FileResponse 直接从磁盘发送（支持时走 sendfile）；发送完成后删除临时文件
+        return FileResponse(
+            export_path,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
             headers={
                 "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
-            }
+            },
+            background=BackgroundTask(os.unlink, export_path),
         )
 
     except HTTPException:
@@ -1204,81 +1406,128 @@ async def export_sheet(
 
 
 # Supplier API endpoints
-@router.get("/suppliers/search")
-async def search_suppliers(q: str, limit: int = 10, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+# 以下端点只做同步数据库访问，声明为普通 def 让 FastAPI 放到线程池执行，避免阻塞事件循环
+@router.get("/suppliers/search", response_model=SupplierSearchResponse)
+def search_suppliers(q: str, limit: int = 10, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Search suppliers by name, phone, or contact"""
+    # 数据库异常由 main.py 注册的 SQLAlchemyError 处理器统一返回 500
+    supplier_service = SupplierService(db)
+    # 只查返回需要的列，不构建 ORM 对象
+    suppliers = supplier_service.search_supplier_rows(q, limit=limit)
+
+    # Row 按属性取值，直接交给 SupplierOut 校验和序列化（pydantic-core），datetime 自动输出 ISO 格式
+    return SupplierSearchResponse(suppliers=[SupplierOut.model_validate(s) for s in suppliers])
+
+
+# 供应商列表流式输出时每批从游标读取并编码的行数
+SUPPLIER_STREAM_BATCH = 500
+
+
+def _encode_supplier_cursor(quote_count, supplier_id) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps([quote_count, supplier_id])).decode()
+
+
+def _decode_supplier_cursor(cursor: str) -> tuple:
+    """解析列表游标为 (quote_count, id)，格式不对时抛出 ValueError"""
     try:
-        supplier_service = SupplierService(db)
-        suppliers = supplier_service.search_suppliers(q, limit=limit)
+        quote_count, supplier_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(quote_count, int) or not isinstance(supplier_id, int):
+        raise ValueError("invalid cursor")
+    return quote_count, supplier_id
 
-        result = []
-        for s in suppliers:
-            result.append({
-                "id": s.id,
-                "company_name": s.company_name,
-                "contact_phone": s.contact_phone,
-                "contact_name": s.contact_name,
-                "owner": s.owner,
-                "tags": s.tags or [],
-                "quote_count": s.quote_count,
-                "last_quote_date": s.last_quote_date.isoformat() if s.last_quote_date else None
-            })
 
-        return {"suppliers": result}
+def _stream_supplier_rows(db: Session, rows, limit: int, total: int):
+    """逐批编码供应商行并输出 JSON 片段，内存占用只与批大小相关；结束后关闭会话
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to search suppliers: {str(e)}")
+    total 为供应商总数（不是本页行数）。返回满页时在末尾附带 next_cursor（最后一行的键集游标），否则为 null。
+    """
+    try:
+        yield b'{"suppliers":['
+        count = 0
+        last = None
+        for batch in rows.partitions():
+            chunk = b",".join(orjson.dumps({**row, "tags": row["tags"] or []}) for row in batch)
+            yield (b"," + chunk) if count else chunk
+            count += len(batch)
+            last = batch[-1]
+        next_cursor = None
+        if last is not None and count >= limit:
+            # 与排序键一致，NULL 报价次数按 0 编码
+            next_cursor = _encode_supplier_cursor(last["quote_count"] or 0, last["id"])
+        yield b'],"total":' + str(total).encode() + b',"next_cursor":' + orjson.dumps(next_cursor) + b"}"
+    finally:
+        db.close()
 
 
 @router.get("/suppliers/list")
-async def list_suppliers_endpoint(limit: int = 50, offset: int = 0, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """Get list of suppliers"""
+def list_suppliers_endpoint(
+    request: Request,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+):
+    """Get list of suppliers; pass the previous page's next_cursor to page by key instead of offset"""
+
+    after = None
+    if cursor:
+        try:
+            after = _decode_supplier_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="无效的分页游标")
+
+    # 流式响应在端点返回后才消费游标，不能使用请求结束即关闭的依赖注入会话
+    db = SessionLocal()
     try:
         supplier_service = SupplierService(db)
-        suppliers = supplier_service.list_suppliers(limit=limit, offset=offset)
+        # ETag 由分页参数 + 总行数 + 最近更新时间决定，未变化时直接 304，不查询也不序列化列表
+        version = supplier_service.get_list_version()
+        etag = '"' + hashlib.blake2b(
+            orjson.dumps([limit, offset, cursor, version[0], version[1]]), digest_size=8
+        ).hexdigest() + '"'
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            db.close()
+            return Response(status_code=304, headers=cache_headers)
 
-        result = []
-        for s in suppliers:
-            # 查询创建者信息
-            created_by_name = None
-            if s.created_by:
-                creator = db.query(User).filter(User.id == s.created_by).first()
-                if creator:
-                    created_by_name = creator.display_name or creator.username
+        # Core 查询直接返回列映射，创建者名称通过 LEFT JOIN 一并取回
+        rows = supplier_service.list_supplier_rows(
+            limit=limit, offset=offset, batch_size=SUPPLIER_STREAM_BATCH, after=after
+        )
+    except Exception:
+        db.close()
+        raise
 
-            result.append({
-                "id": s.id,
-                "company_name": s.company_name,
-                "contact_phone": s.contact_phone,
-                "contact_name": s.contact_name,
-                "owner": s.owner,
-                "tags": s.tags or [],
-                "quote_count": s.quote_count,
-                "last_quote_date": s.last_quote_date.isoformat() if s.last_quote_date else None,
-                "created_at": s.created_at.isoformat() if s.created_at else None,
-                "created_by_name": created_by_name
-            })
+    # 生成器的 finally 在输出结束后关闭会话；客户端在开始迭代前断开时生成器不会执行，
+    # 由响应的后台任务兜底关闭（Session.close 可重复调用）
+    return StreamingResponse(
+        _stream_supplier_rows(db, rows, limit, total=version[0]),
+        media_type="application/json",
+        headers=cache_headers,
+        background=BackgroundTask(db.close),
+    )
 
-        return {"suppliers": result, "total": len(result)}
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list suppliers: {str(e)}")
+@router.delete("/suppliers")
+def bulk_delete_suppliers_endpoint(request: BulkDeleteSuppliersRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Delete several suppliers in one request"""
+    supplier_service = SupplierService(db)
+    deleted = supplier_service.delete_suppliers(list(set(request.ids)))
+    return {"deleted": sorted(deleted)}
 
 
 @router.delete("/suppliers/{supplier_id}")
-async def delete_supplier_endpoint(supplier_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def delete_supplier_endpoint(supplier_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Delete a supplier"""
-    try:
-        supplier_service = SupplierService(db)
-        success = supplier_service.delete_supplier(supplier_id)
+    supplier_service = SupplierService(db)
+    success = supplier_service.delete_supplier(supplier_id)
 
-        if not success:
-            raise HTTPException(status_code=404, detail="Supplier not found")
+    if not success:
+        raise HTTPException(status_code=404, detail="Supplier not found")
 
-        return {"message": "删除成功"}
-
-    except HTTPException:
-        raise
+    return {"message": "删除成功"}
 
 
 @router.post("/suppliers/recommend")
@@ -1297,11 +1546,11 @@ async def recommend_suppliers_endpoint(request: RecommendRequest, db: Session =
         result = []
 
         # 批量查询创建者信息
-        creator_ids = [rec.get("created_by") for rec in recommendations if rec.get("created_by")]
+        creator_ids = {rec.get("created_by") for rec in recommendations if rec.get("created_by")}
         creators = {}
         if creator_ids:
-            from ..models.database import User
-            users = db.query(User).filter(User.id.in_(creator_ids)).all()
+            # 只取需要的列，不加载整行 User
+            users = db.query(User.id, User.display_name, User.username).filter(User.id.in_(creator_ids)).all()
             creators = {u.id: u.display_name or u.username for u in users}
 
         for idx, rec in enumerate(recommendations, start=1):
@@ -1443,18 +1692,20 @@ class ExtractSuppliersRequest(BaseModel):
     sheet_data: list
 
 
+# 匹配手机号（11位）和座机（区号-号码）
+_PHONE_PATTERNS = (
+    re.compile(r'1[3-9]\d{9}'),  # 手机号
+    re.compile(r'0\d{2,3}-?\d{7,8}'),  # 座机
+)
+
+
 def _extract_phones_from_text(text: str) -> list:
     """用正则从文本中提取电话号码"""
     if not text:
         return []
-    # 匹配手机号（11位）和座机（区号-号码）
-    patterns = [
-        r'1[3-9]\d{9}',  # 手机号
-        r'0\d{2,3}-?\d{7,8}',  # 座机
-    ]
     phones = []
-    for pattern in patterns:
-        matches = re.findall(pattern, text)
+    for pattern in _PHONE_PATTERNS:
+        matches = pattern.findall(text)
         phones.extend(matches)
     return phones
 
@@ -1462,7 +1713,6 @@ def _extract_phones_from_text(text: str) -> list:
 def _extract_suppliers_background(supplier_entries: list, user_id: str):
     """后台任务：使用AI提取供应商信息并保存到数据库，同时保存品牌标签和产品关联"""
     from ..core.llm import extract_suppliers_with_llm
-    from ..models.database import get_db_session
 
     if not supplier_entries:
         return
@@ -1486,8 +1736,7 @@ def _extract_suppliers_background(supplier_entries: list, user_id: str):
                 text_to_entries[text] = []
             text_to_entries[text].append(entry)
 
-        db = next(get_db_session())
-        try:
+        with SessionLocal() as db:
             supplier_service = SupplierService(db)
             seen_phones = set()
             saved_count = 0
@@ -1545,8 +1794,6 @@ def _extract_suppliers_background(supplier_entries: list, user_id: str):
 
             if saved_count > 0:
                 add_notification(user_id, f"已成功新增 {saved_count} 个供应商", "success")
-        finally:
-            db.close()
 
     except Exception as e:
         print(f"[后台任务] 供应商提取失败: {e}")
@@ -1574,14 +1821,12 @@ async def extract_suppliers_from_sheet(
     name_col = cols.get("name")
     brand_col = cols.get("brand")
     model_col = cols.get("model")
+    slot_nums = schema.get("slot_nums") or []
 
     def _get_cell(row, idx):
         if not isinstance(idx, int) or idx >= len(row):
             return None
-        v = row[idx]
-        if v and str(v).strip() and str(v).strip().lower() != "none":
-            return str(v).strip()
-        return None
+        return cell_text(row[idx]) or None
 
     # 收集供应商信息及关联的产品信息
     supplier_entries = []
@@ -1593,7 +1838,7 @@ async def extract_suppliers_from_sheet(
         row_brand = _get_cell(row, brand_col)
         row_model = _get_cell(row, model_col)
 
-        for slot_num in sorted(slots.keys()):
+        for slot_num in slot_nums:
             slot_map = slots.get(slot_num) or {}
             supplier_idx = slot_map.get("供应商")
             brand_slot_idx = slot_map.get("品牌")
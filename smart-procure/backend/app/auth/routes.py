@@ -4,6 +4,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from datetime import datetime
+import asyncio
 
 from ..models.database import get_db, User
 from .schemas import UserRegister, UserLogin, UserResponse, TokenResponse
@@ -23,10 +24,13 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
             detail="用户名已存在"
         )
 
+    # bcrypt 哈希耗时较长，放到线程池执行，不阻塞事件循环
+    password_hash = await asyncio.to_thread(get_password_hash, user_data.password)
+
     # 创建新用户
     new_user = User(
         username=user_data.username,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=password_hash,
         display_name=user_data.display_name or user_data.username
     )
 
@@ -54,8 +58,8 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
             detail="用户名或密码错误"
         )
 
-    # 验证密码
-    if not verify_password(user_data.password, user.password_hash):
+    # 验证密码（bcrypt 校验放到线程池执行，不阻塞事件循环）
+    if not await asyncio.to_thread(verify_password, user_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误"
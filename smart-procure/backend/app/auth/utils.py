@@ -78,7 +78,8 @@ async def get_current_user(
     if user_id is None:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == user_id).first()
+    # 按主键加载：先查会话的 identity map，命中则不发 SQL
+    user = db.get(User, user_id)
     if user is None:
         raise credentials_exception
 
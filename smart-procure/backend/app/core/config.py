@@ -19,7 +19,11 @@ def setup_logging():
 
 class Settings:
     API_KEY = os.getenv("API_KEY")
+    # 未配置或仍是占位符的 API Key 走 Mock 回复；启动时判断一次
+    USE_MOCK_LLM = not API_KEY or "placeholder" in API_KEY
     DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+    # 对话结果缓存有效期（秒），0 表示关闭
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "600"))
 
     # Qdrant 向量数据库配置
     QDRANT_HOST = os.getenv("QDRANT_HOST", "qdrant")
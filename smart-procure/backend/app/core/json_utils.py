@@ -0,0 +1,22 @@
+"""
+JSON 序列化：优先用 orjson；orjson 不支持超过 64 位的整数（表格里的长数字编码会触发），
+此时回退到标准库 json，保证接口不因个别单元格报 500。
+"""
+import json
+from typing import Any
+
+import orjson
+
+
+def dumps_bytes(obj: Any, option: int = 0) -> bytes:
+    """序列化为UTF-8 JSON字节串，不转义中文"""
+    try:
+        return orjson.dumps(obj, option=option)
+    except TypeError:
+        # orjson.JSONEncodeError 是 TypeError 的子类；json 对超长整数、非字符串键都能处理
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def dumps(obj: Any, option: int = 0) -> str:
+    """序列化为JSON字符串，不转义中文"""
+    return dumps_bytes(obj, option).decode()
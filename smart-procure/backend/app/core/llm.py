@@ -1,11 +1,17 @@
 import json
+import logging
 import re
 import os
+import orjson
 from typing import Any, Dict, List, Optional
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from .config import settings
+from . import llm_cache
+
+logger = logging.getLogger(__name__)
 
 _client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
 
 def get_client() -> OpenAI:
     global _client
@@ -16,72 +22,134 @@ def get_client() -> OpenAI:
         )
     return _client
 
+def get_async_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=settings.API_KEY,
+            base_url="https://api.deepseek.com"
+        )
+    return _async_client
+
+_JSON_DECODER = json.JSONDecoder()
+# JSON 对象/数组可能的起始位置
+_JSON_START_RE = re.compile(r"[\{\[]")
+
 def _extract_first_json(text: str) -> Optional[str]:
     if not isinstance(text, str):
         return None
     cleaned = text.strip().replace("```json", "").replace("```", "").strip()
-    decoder = json.JSONDecoder()
-    for i, ch in enumerate(cleaned):
-        if ch not in "{[":
-            continue
+    # 只在 { / [ 处尝试解析；raw_decode 传起始下标，不再每次切片复制剩余文本。
+    # 常见情况下整段就是 JSON，第一个候选即成功
+    for m in _JSON_START_RE.finditer(cleaned):
+        i = m.start()
         try:
-            _, end = decoder.raw_decode(cleaned[i:])
-            return cleaned[i:i + end]
+            _, end = _JSON_DECODER.raw_decode(cleaned, i)
+            return cleaned[i:end]
         except Exception:
             continue
     return None
 
+def _use_mock() -> bool:
+    return settings.USE_MOCK_LLM
+
+def _mock_reply(user_message: str, history_messages: Optional[List[Dict[str, Any]]]) -> str:
+    history_text = ""
+    if history_messages:
+        history_text = " ".join([str(m.get("content", "")) for m in history_messages if m.get("role") == "user"])
+    combined = (history_text + " " + user_message).strip()
+    return mock_llm_response(combined)
+
+def _build_messages(system_prompt: str, user_message: str, history_messages: Optional[List[Dict[str, Any]]]) -> List[Dict[str, str]]:
+    messages: List[Dict[str, str]] = [{"role": "system", "content": system_prompt}]
+    if history_messages:
+        for m in history_messages:
+            role = m.get("role")
+            content = m.get("content")
+            if role in ("user", "assistant") and isinstance(content, str) and content.strip():
+                messages.append({"role": role, "content": content})
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def _parse_json_reply(content: str) -> Optional[str]:
+    """从模型输出中取出合法的 JSON 文本；取不到返回 None"""
+    try:
+        # clear markdown code blocks if any
+        clean_content = content.replace("```json", "").replace("```", "").strip()
+        orjson.loads(clean_content)
+        return clean_content
+    except:
+        extracted = _extract_first_json(content)
+        if extracted is not None:
+            try:
+                orjson.loads(extracted)
+                return extracted
+            except Exception:
+                pass
+        return None
+
+_FORMAT_ERROR_REPLY = json.dumps({"action": "ASK", "content": "LLM返回格式错误: 无法提取JSON"})
+
+def _clean_json_reply(content: str) -> str:
+    # Ensure it's valid JSON
+    parsed = _parse_json_reply(content)
+    return parsed if parsed is not None else _FORMAT_ERROR_REPLY
+
 def call_llm(system_prompt: str, user_message: str, history_messages: Optional[List[Dict[str, Any]]] = None):
     # Mock behavior if no valid key
-    if not settings.API_KEY or "placeholder" in settings.API_KEY:
-        history_text = ""
-        if history_messages:
-            history_text = " ".join([str(m.get("content", "")) for m in history_messages if m.get("role") == "user"])
-        combined = (history_text + " " + user_message).strip()
-        return mock_llm_response(combined)
+    if _use_mock():
+        return _mock_reply(user_message, history_messages)
 
     try:
-        messages: List[Dict[str, str]] = [{"role": "system", "content": system_prompt}]
-        if history_messages:
-            for m in history_messages:
-                role = m.get("role")
-                content = m.get("content")
-                if role in ("user", "assistant") and isinstance(content, str) and content.strip():
-                    messages.append({"role": role, "content": content})
-        messages.append({"role": "user", "content": user_message})
-
         response = get_client().chat.completions.create(
             model="deepseek-chat", 
-            messages=messages,
+            messages=_build_messages(system_prompt, user_message, history_messages),
             stream=False
         )
-        content = response.choices[0].message.content
-        # Ensure it's valid JSON
-        try:
-            # clear markdown code blocks if any
-            clean_content = content.replace("```json", "").replace("```", "").strip()
-            json.loads(clean_content)
-            return clean_content
-        except:
-            extracted = _extract_first_json(content)
-            if extracted is not None:
-                try:
-                    json.loads(extracted)
-                    return extracted
-                except Exception:
-                    pass
-            return json.dumps({"action": "ASK", "content": "LLM返回格式错误: 无法提取JSON"})
+        return _clean_json_reply(response.choices[0].message.content)
             
     except Exception as e:
         print(f"LLM Error: {e}")
         return json.dumps({"action": "ASK", "content": f"LLM调用失败: {str(e)}"})
 
+async def acall_llm(system_prompt: str, user_message: str, history_messages: Optional[List[Dict[str, Any]]] = None):
+    """call_llm 的异步版本：等待模型响应时不占用事件循环，也不占线程池"""
+    if _use_mock():
+        return _mock_reply(user_message, history_messages)
+
+    messages = _build_messages(system_prompt, user_message, history_messages)
+    # 完全相同的对话（提示词里已包含表格摘要和工具结果）直接复用上次的输出
+    cache_key = llm_cache.make_key(messages)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        response = await get_async_client().chat.completions.create(
+            model="deepseek-chat",
+            messages=messages,
+            stream=False
+        )
+        parsed = _parse_json_reply(response.choices[0].message.content)
+        if parsed is None:
+            return _FORMAT_ERROR_REPLY
+        # 只缓存成功解析出的结果，格式错误/调用失败下次重新请求
+        llm_cache.put(cache_key, parsed)
+        return parsed
+
+    except Exception as e:
+        logger.error("LLM call failed", exc_info=True)
+        return json.dumps({"action": "ASK", "content": f"LLM调用失败: {str(e)}"})
+
+# Mock 模式下识别 "第2行 100元" 这类行号 + 价格的输入
+_ROW_PRICE_RE = re.compile(r'(\d+)\s*(?:行|号).*?(\d+(?:\.\d+)?)\s*(?:元|块)')
+
 def mock_llm_response(message: str):
     # Simple regex mock for testing without API Key
     
     # Check for "Row X Price Y" pattern
     # e.g. "第2行 100元"
-    match = re.search(r'(\d+)\s*(?:行|号).*?(\d+(?:\.\d+)?)\s*(?:元|块)', message)
+    match = _ROW_PRICE_RE.search(message)
     if match:
         row = int(match.group(1))
         price = float(match.group(2))
@@ -150,7 +218,7 @@ def extract_suppliers_with_llm(supplier_texts: List[str]) -> List[Dict[str, Any]
     user_message = "请从以下供应商文本中提取信息：\n\n" + "\n".join([f"{i+1}. {t}" for i, t in enumerate(unique_texts[:50])])  # 限制50条
 
     # 如果没有API Key，返回空
-    if not settings.API_KEY or "placeholder" in settings.API_KEY:
+    if _use_mock():
         print("[供应商提取] 无API Key，跳过AI提取")
         return []
 
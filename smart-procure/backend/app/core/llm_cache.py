@@ -0,0 +1,44 @@
+"""
+LLM 响应的进程内 TTL 缓存：提示词（含表格摘要、工具结果）、历史和用户消息完全相同时，
+直接复用上次的模型输出，不再等一次 LLM 往返。
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import orjson
+
+from .config import settings
+
+_MAX_ENTRIES = 256
+
+# key -> (过期时间, 模型输出文本)
+_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+
+def make_key(*parts: Any) -> str:
+    """把提示词、历史、用户消息拼成缓存键"""
+    return hashlib.blake2b(orjson.dumps(parts, option=orjson.OPT_NON_STR_KEYS), digest_size=16).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    item = _cache.get(key)
+    if item is None:
+        return None
+    expires_at, payload = item
+    if expires_at < time.monotonic():
+        _cache.pop(key, None)
+        return None
+    _cache.move_to_end(key)
+    return payload
+
+
+def put(key: str, value: str) -> None:
+    ttl = settings.LLM_CACHE_TTL
+    if ttl <= 0:
+        return
+    _cache[key] = (time.monotonic() + ttl, value)
+    _cache.move_to_end(key)
+    while len(_cache) > _MAX_ENTRIES:
+        _cache.popitem(last=False)
@@ -6,7 +6,9 @@ from fastapi.responses import JSONResponse
 from .api import routes
 from .auth import auth_router
 from .models.columns import HEADERS
-from .models.database import init_db
+from .models.database import engine, init_db
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 from .core.config import setup_logging
 
 # 初始化日志配置
@@ -28,6 +30,15 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": "服务器内部错误，请稍后重试"}
     )
 
+@app.exception_handler(SQLAlchemyError)
+async def database_exception_handler(request: Request, exc: SQLAlchemyError):
+    """数据库异常统一处理，不把 SQL 细节暴露给客户端"""
+    logger.error(f"Database error on {request.url.path}: {exc}", exc_info=True)
+    return JSONResponse(
+        status_code=500,
+        content={"detail": "数据库错误，请稍后重试"}
+    )
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
@@ -56,3 +67,15 @@ async def init_sheet():
 @app.get("/")
 async def root():
     return {"message": "SmartProcure API Running"}
+
+
+@app.get("/healthz")
+def healthz():
+    """健康检查：执行 SELECT 1，连接池耗尽或数据库不可用时返回 503"""
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    except Exception as e:
+        logger.error(f"Health check failed: {e}")
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    return {"status": "ok"}
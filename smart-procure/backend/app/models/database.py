@@ -15,7 +15,17 @@ if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL 环境变量未设置，请在 .env 文件中配置")
 
 # Create engine and session
-engine = create_engine(DATABASE_URL)
+# 连接池参数：默认 5 连接的池在并发请求下容易排队超时；sqlite 本地开发不需要
+_engine_kwargs = {}
+if not DATABASE_URL.startswith("sqlite"):
+    _engine_kwargs = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "20")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "40")),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "5")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": True,
+    }
+engine = create_engine(DATABASE_URL, **_engine_kwargs)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -53,6 +63,12 @@ class InquirySheet(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
+# 询价单列表排序键 COALESCE(updated_at, created_at, 兜底值) 的兜底值（两个时间都为空的行排在最后）。
+# 写成 SQL 字面量而不是绑定参数，查询表达式才能与 ix_inquiry_sheets_list_order 的索引表达式逐字一致；
+# 取 SQLAlchemy 在 SQLite 中存储 DateTime 的文本格式，按字符串比较时与真实时间戳同序
+SHEET_SORT_AT_FLOOR_SQL = "'1970-01-01 00:00:00.000000'"
+
+
 class Supplier(Base):
     """Supplier model for storing supplier information"""
     __tablename__ = "suppliers"
@@ -72,7 +88,7 @@ class Supplier(Base):
     tags = Column(JSON, default=list)
 
     # Statistics
-    quote_count = Column(Integer, default=0)
+    quote_count = Column(Integer, default=0)  # 供应商列表按报价次数倒序分页，索引见 init_db
     last_quote_date = Column(DateTime)
 
     # Timestamps
@@ -104,6 +120,19 @@ class SupplierProduct(Base):
 def init_db():
     """Initialize database tables"""
     Base.metadata.create_all(bind=engine)
+    # create_all 不会给已存在的表补建索引，这里显式补上
+    with engine.begin() as conn:
+        # 单列 quote_count 索引已被下面的列表索引取代，没有查询再用它，只增加写入开销
+        conn.execute(text("DROP INDEX IF EXISTS ix_suppliers_quote_count"))
+        # 供应商列表按 (COALESCE(quote_count, 0), id) 倒序做键集分页
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_suppliers_list_order ON suppliers (COALESCE(quote_count, 0) DESC, id DESC)"
+        ))
+        # 询价单列表按用户过滤后按 (排序键, id) 倒序做键集分页
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_inquiry_sheets_list_order ON inquiry_sheets "
+            f"(user_id, COALESCE(updated_at, created_at, {SHEET_SORT_AT_FLOOR_SQL}) DESC, id DESC)"
+        ))
 
 
 def get_db():
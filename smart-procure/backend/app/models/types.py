@@ -11,6 +11,12 @@ class ChatRequest(BaseModel):
     chat_history: Optional[List[ChatHistoryMessage]] = None
     enabled_tools: Optional[List[str]] = None  # 启用的工具列表，None 表示全部启用
 
+class BatchChatRequest(BaseModel):
+    messages: List[str]  # 按顺序处理，后一条基于前一条写入后的表格
+    current_sheet_data: Optional[List[List[Any]]] = None
+    chat_history: Optional[List[ChatHistoryMessage]] = None
+    enabled_tools: Optional[List[str]] = None
+
 class UpdateAction(BaseModel):
     target_row: int
     price: float
@@ -69,3 +75,7 @@ class ChatResponse(BaseModel):
     content: Optional[str] = None
     data: Optional[Any] = None
     updated_sheet: Optional[List[List[Any]]] = None
+
+class BatchChatResponse(BaseModel):
+    results: List[ChatResponse]
+    updated_sheet: Optional[List[List[Any]]] = None  # 最后一次写入后的表格，无写入为 None
@@ -1,5 +1,11 @@
-import json
-from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import orjson
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..core import json_utils
+
+logger = logging.getLogger(__name__)
 
 
 ToolFn = Callable[[Dict[str, Any]], Dict[str, Any]]
@@ -8,9 +14,16 @@ ToolFn = Callable[[Dict[str, Any]], Dict[str, Any]]
 class ToolRegistry:
     def __init__(self):
         self._tools: Dict[str, Tuple[Dict[str, Any], ToolFn]] = {}
+        self._serial: set = set()
 
-    def register(self, name: str, spec: Dict[str, Any], fn: ToolFn):
+    def register(self, name: str, spec: Dict[str, Any], fn: ToolFn, parallel_safe: bool = True):
+        """parallel_safe=False 的工具依赖共享状态（如浏览器会话），必须按顺序执行"""
         self._tools[name] = (spec, fn)
+        if not parallel_safe:
+            self._serial.add(name)
+
+    def can_run_parallel(self, names: List[str]) -> bool:
+        return len(names) > 1 and not any(n in self._serial for n in names)
 
     def describe(self) -> List[Dict[str, Any]]:
         return [{"name": n, **spec} for n, (spec, _) in self._tools.items()]
@@ -31,16 +44,22 @@ def _safe_json_loads(text: str) -> Optional[Dict[str, Any]]:
     if not isinstance(text, str):
         return None
     try:
-        obj = json.loads(text)
+        obj = orjson.loads(text)
         return obj if isinstance(obj, dict) else None
     except Exception:
         return None
 
 
+def _dumps(obj: Any) -> str:
+    # 工具结果可能带非字符串键，按 json.dumps 的习惯转成字符串；
+    # 单元格原值可能是超出 64 位的长数字编码，由 json_utils 回退到标准库 json
+    return json_utils.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+
 def _tool_results_block(tool_results: List[Dict[str, Any]]) -> str:
     if not tool_results:
         return "[]"
-    return json.dumps(tool_results, ensure_ascii=False)
+    return _dumps(tool_results)
 
 
 def build_planner_prompt(
@@ -243,6 +262,10 @@ def build_planner_prompt(
 ```json
 {{"action":"CALL_TOOL","tool":"supplier_lookup","args":{{"name":"张三"}}}}
 ```
+多个互不依赖的工具可以放进 calls 一次发出，会并行执行（浏览器工具有先后依赖，必须逐个调用）：
+```json
+{{"action":"CALL_TOOL","calls":[{{"tool":"supplier_lookup","args":{{"name":"张三"}}}},{{"tool":"web_search_supplier","args":{{"brand":"FESTO"}}}}]}}
+```
 
 2. **ASK** - 询问用户
 ```json
@@ -379,16 +402,20 @@ Planner草稿（JSON）：{draft_json}
 """
 
 
-def run_two_stage_agent(
+# 单步最多并发执行的工具调用数
+MAX_PARALLEL_TOOL_CALLS = 4
+
+
+async def run_two_stage_agent(
     *,
-    call_llm: Callable[[str, str, Optional[List[Dict[str, Any]]]], str],
+    call_llm: Callable[[str, str, Optional[List[Dict[str, Any]]]], Awaitable[str]],
     user_message: str,
     history_messages: Optional[List[Dict[str, Any]]],
     context: Dict[str, str],
     tools: ToolRegistry,
     max_tool_steps: int = 3,
 ) -> Dict[str, Any]:
-    tools_catalog_json = json.dumps(tools.describe(), ensure_ascii=False)
+    tools_catalog_json = _dumps(tools.describe())
     tool_results: List[Dict[str, Any]] = []
     draft: Dict[str, Any] = {}
 
@@ -405,26 +432,38 @@ def run_two_stage_agent(
             tools_catalog_json=tools_catalog_json,
             tool_results_json=_tool_results_block(tool_results),
         )
-        planner_out_str = call_llm(planner_prompt, user_message, history_messages)
-        import logging
-        logging.warning(f"[DEBUG] Planner LLM 响应: {planner_out_str[:500]}...")
+        planner_out_str = await call_llm(planner_prompt, user_message, history_messages)
+        logger.debug("Planner LLM 响应: %.500s...", planner_out_str)
         planner_out = _safe_json_loads(planner_out_str) or {}
-        logging.warning(f"[DEBUG] Planner 解析结果: action={planner_out.get('action')}, tool={planner_out.get('tool')}")
+        logger.debug("Planner 解析结果: action=%s, tool=%s", planner_out.get("action"), planner_out.get("tool"))
 
         action = planner_out.get("action")
         if action == "ASK":
             return {"action": "ASK", "content": planner_out.get("content")}
 
         if action == "CALL_TOOL":
-            tool_name = planner_out.get("tool")
-            args = planner_out.get("args") or {}
-            if not isinstance(tool_name, str) or not tool_name.strip():
-                return {"action": "ASK", "content": "Planner未提供有效的tool名称"}
-            if not isinstance(args, dict):
-                args = {}
-            tool_result = tools.execute(tool_name.strip(), args)
-            logging.warning(f"[DEBUG] 工具执行结果: {str(tool_result)[:500]}")
-            tool_results.append(tool_result)
+            raw_calls = planner_out.get("calls")
+            if not isinstance(raw_calls, list) or not raw_calls:
+                raw_calls = [{"tool": planner_out.get("tool"), "args": planner_out.get("args")}]
+            calls: List[Tuple[str, Dict[str, Any]]] = []
+            for c in raw_calls[:MAX_PARALLEL_TOOL_CALLS]:
+                tool_name = c.get("tool") if isinstance(c, dict) else None
+                if not isinstance(tool_name, str) or not tool_name.strip():
+                    return {"action": "ASK", "content": "Planner未提供有效的tool名称"}
+                args = c.get("args") or {}
+                calls.append((tool_name.strip(), args if isinstance(args, dict) else {}))
+
+            # 工具是同步实现（数据库/HTTP/浏览器），放到线程里执行，不阻塞事件循环；
+            # 互不依赖的多个调用并发执行，耗时取决于最慢的一个
+            if tools.can_run_parallel([name for name, _ in calls]):
+                step_results = await asyncio.gather(
+                    *[asyncio.to_thread(tools.execute, name, args) for name, args in calls]
+                )
+            else:
+                step_results = [await asyncio.to_thread(tools.execute, name, args) for name, args in calls]
+            for tool_result in step_results:
+                logger.debug("工具执行结果: %.500s", tool_result)
+                tool_results.append(tool_result)
             continue
 
         if action == "DONE":
@@ -445,9 +484,9 @@ def run_two_stage_agent(
         relevant_rows_json=context["relevant_rows_json"],
         total_relevant_rows=context["total_relevant_rows"],
         tool_results_json=_tool_results_block(tool_results),
-        draft_json=json.dumps(draft, ensure_ascii=False),
+        draft_json=_dumps(draft),
     )
-    writer_out_str = call_llm(writer_prompt, user_message, history_messages)
+    writer_out_str = await call_llm(writer_prompt, user_message, history_messages)
     writer_out = _safe_json_loads(writer_out_str) or {}
     w_action = writer_out.get("action")
     if w_action == "ASK":
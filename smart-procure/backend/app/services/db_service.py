@@ -1,10 +1,11 @@
 """
 Database service for inquiry sheet operations
 """
+from sqlalchemy import DateTime, func, literal_column, select, tuple_
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Optional
 from datetime import datetime
-from app.models.database import InquirySheet
+from app.models.database import InquirySheet, SHEET_SORT_AT_FLOOR_SQL
 
 
 class DBService:
@@ -63,16 +64,52 @@ class DBService:
             InquirySheet.user_id == user_id
         ).first()
 
-    def list_sheets(self, user_id: str, limit: int = 50, offset: int = 0) -> List[InquirySheet]:
-        """Get list of inquiry sheets, ordered by updated_at descending"""
-        return (
-            self.db.query(InquirySheet)
-            .filter(InquirySheet.user_id == user_id)
-            .order_by(InquirySheet.updated_at.desc())
+    def list_sheet_summaries(
+        self,
+        user_id: str,
+        limit: int = 50,
+        offset: int = 0,
+        after: Optional[tuple] = None,
+    ) -> list:
+        """List sheet metadata only (no sheet_data/chat_history), ordered by (sort_at, id) descending
+
+        sort_at 为 updated_at，为空时依次退回 created_at、1970-01-01，保证排序键非空，
+        NULL 行既不会被键集条件跳过，也不会因数据库 NULL 排序规则不同而错位。
+        after 为上一页最后一行的 (sort_at, id)，给出时按键集分页，不再依赖 OFFSET 扫描。
+        """
+        sort_at = func.coalesce(
+            InquirySheet.updated_at, InquirySheet.created_at, literal_column(SHEET_SORT_AT_FLOOR_SQL, DateTime)
+        )
+        stmt = (
+            select(
+                InquirySheet.id,
+                InquirySheet.name,
+                InquirySheet.item_count,
+                InquirySheet.completion_rate,
+                InquirySheet.created_at,
+                InquirySheet.updated_at,
+                sort_at.label("sort_at"),
+            )
+            .where(InquirySheet.user_id == user_id)
+            .order_by(sort_at.desc(), InquirySheet.id.desc())
             .limit(limit)
-            .offset(offset)
-            .all()
         )
+        if after is not None:
+            # 行值比较，可作为 ix_inquiry_sheets_list_order 上的范围条件；
+            # 冗余的首列上界让 SQLite 也能在表达式索引上定位，而不是从头扫描
+            stmt = stmt.where(
+                sort_at <= after[0],
+                tuple_(sort_at, InquirySheet.id) < tuple_(*after),
+            )
+        else:
+            stmt = stmt.offset(offset)
+        return self.db.execute(stmt).all()
+
+    def count_sheets(self, user_id: str) -> int:
+        """Count all inquiry sheets of a user"""
+        return self.db.execute(
+            select(func.count()).select_from(InquirySheet).where(InquirySheet.user_id == user_id)
+        ).scalar_one()
 
     def delete_sheet(self, sheet_id: str, user_id: str) -> bool:
         """Delete an inquiry sheet"""
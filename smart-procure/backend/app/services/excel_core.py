@@ -1,8 +1,11 @@
+import logging
 from ..models.columns import SLOT_TEMPLATE
 from ..models.types import UpdateAction
 from .sheet_schema import build_sheet_schema, normalize_header
 from typing import List, Any, Dict, Optional, Tuple
 
+logger = logging.getLogger(__name__)
+
 def _ensure_row_len(row: List[Any], length: int):
     while len(row) < length:
         row.append(None)
@@ -31,6 +34,7 @@ def set_slot_values(row: List[Any], schema: Dict[str, Any], slot_num: int, value
 def get_price(slot_values: Dict[str, Any]) -> float:
     try:
         val = slot_values.get("单价")
+        # 写入路径沿用原有空值规则，不用 sheet_schema.cell_text
         if val is None or val == "" or val == "None":
             return float('inf')
         return float(val)
@@ -67,11 +71,19 @@ def is_same_core_offer(offer1: Dict[str, Any], offer2: Dict[str, Any]) -> bool:
 def merge_offers(existing: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
     """合并两个报价，新报价的非空字段会覆盖旧报价"""
     merged = dict(existing)
+    # 写入路径沿用原有空值规则（None、空串、"none"），不用 sheet_schema.cell_text
     for key, value in new.items():
         if value is not None and value != "" and str(value).strip().lower() != "none":
             merged[key] = value
     return merged
 
+def _slot_numbers(schema: Dict[str, Any]) -> List[int]:
+    slot_nums = schema.get("slot_nums")
+    if slot_nums is not None:
+        return slot_nums
+    slots = schema.get("slots") or {}
+    return sorted([int(s) for s in slots.keys() if isinstance(s, int)])
+
 def process_update(sheet_data: List[List[Any]], action: UpdateAction) -> List[List[Any]]:
     # 0-based index for python list, but action.target_row is likely 1-based (Excel row number)
     # If header is row 1 (index 0), then row 2 is index 1.
@@ -81,53 +93,52 @@ def process_update(sheet_data: List[List[Any]], action: UpdateAction) -> List[Li
         # In a real app we might handle this, but for now just return
         return sheet_data
     
-    row = sheet_data[target_idx]
     schema = build_sheet_schema(sheet_data)
-    slots = schema.get("slots") or {}
-    if not slots:
+    slot_numbers = _slot_numbers(schema)
+    if not slot_numbers:
         return sheet_data
 
-    slot_numbers = sorted([int(s) for s in slots.keys() if isinstance(s, int)])
+    _apply_update(sheet_data[target_idx], schema, slot_numbers, action)
+    return sheet_data
+
+def process_updates(sheet_data: List[List[Any]], actions: List[UpdateAction]) -> List[List[Any]]:
+    """批量写入报价：表头不变，schema 只构建一次，各条更新依次原地写入对应行"""
+    if not actions:
+        return sheet_data
+
+    schema = build_sheet_schema(sheet_data)
+    slot_numbers = _slot_numbers(schema)
     if not slot_numbers:
         return sheet_data
 
+    for action in actions:
+        target_idx = action.target_row - 1
+        if target_idx < 0 or target_idx >= len(sheet_data):
+            continue
+        _apply_update(sheet_data[target_idx], schema, slot_numbers, action)
+    return sheet_data
+
+def _cell_text(row: List[Any], col: Optional[int]) -> Optional[str]:
+    """读取单元格文本；列不存在、空值或 "none" 返回 None（col 须已校验为非负整数或 None）"""
+    if col is None or col >= len(row):
+        return None
+    v = row[col]
+    if v is None:
+        return None
+    s = str(v).strip()
+    return s if s and s.lower() != "none" else None
+
+def _apply_update(row: List[Any], schema: Dict[str, Any], slot_numbers: List[int], action: UpdateAction) -> None:
     cols = schema.get("item_columns") or {}
-    model_col = cols.get("model")
-    spec_col = cols.get("spec")
-    brand_col = cols.get("brand")
-    name_col = cols.get("name")
-
-    row_model = None
-    if isinstance(model_col, int) and isinstance(row, list) and 0 <= model_col < len(row):
-        v = row[model_col]
-        if v is not None:
-            s = str(v).strip()
-            if s and s.lower() != "none":
-                row_model = s
-
-    row_spec = None
-    if isinstance(spec_col, int) and isinstance(row, list) and 0 <= spec_col < len(row):
-        v = row[spec_col]
-        if v is not None:
-            s = str(v).strip()
-            if s and s.lower() != "none":
-                row_spec = s
-
-    row_brand = None
-    if isinstance(brand_col, int) and isinstance(row, list) and 0 <= brand_col < len(row):
-        v = row[brand_col]
-        if v is not None:
-            s = str(v).strip()
-            if s and s.lower() != "none":
-                row_brand = s
-
-    row_name = None
-    if isinstance(name_col, int) and isinstance(row, list) and 0 <= name_col < len(row):
-        v = row[name_col]
-        if v is not None:
-            s = str(v).strip()
-            if s and s.lower() != "none":
-                row_name = s
+    # 列下标是否有效只判断一次，读单元格时不再逐个做 isinstance 检查
+    model_col, spec_col, brand_col, name_col = (
+        c if isinstance(c, int) and c >= 0 else None
+        for c in (cols.get("model"), cols.get("spec"), cols.get("brand"), cols.get("name"))
+    )
+    row_model = _cell_text(row, model_col)
+    row_spec = _cell_text(row, spec_col)
+    row_brand = _cell_text(row, brand_col)
+    row_name = _cell_text(row, name_col)
 
     auto_remark = None
     if isinstance(action.quoted_model, str) and action.quoted_model.strip() and row_model:
@@ -182,23 +193,22 @@ def process_update(sheet_data: List[List[Any]], action: UpdateAction) -> List[Li
     offers.sort(key=lambda x: (x[0], x[1]))
     sorted_vals = [v for _, __, v in offers]
 
-    print(f"[DEBUG] process_update - action.price: {action.price}, type: {type(action.price)}")
     p_new = float(action.price)
-    print(f"[DEBUG] process_update - p_new after float(): {p_new}")
+    logger.debug("process_update - action.price: %r, p_new: %s", action.price, p_new)
 
     # 先检查是否存在核心相同的报价（价格、货期、品牌相同）
     # 如果存在，则合并字段而不是插入新报价
     found_matching = False
     for i, v in enumerate(sorted_vals):
         if is_same_core_offer(v, new_offer):
-            print(f"[DEBUG] 发现核心相同的报价，执行合并而非插入")
+            logger.debug("发现核心相同的报价，执行合并而非插入")
             sorted_vals[i] = merge_offers(v, new_offer)
             found_matching = True
             break
 
     # 如果没有找到匹配的报价，则按价格排序插入
     if not found_matching:
-        print(f"[DEBUG] 未找到匹配报价，按价格插入新报价")
+        logger.debug("未找到匹配报价，按价格插入新报价")
         out_vals: List[Dict[str, Any]] = []
         inserted = False
         for v in sorted_vals:
@@ -219,5 +229,3 @@ def process_update(sheet_data: List[List[Any]], action: UpdateAction) -> List[Li
             set_slot_values(row, schema, slot_num, final_vals[i])
         else:
             set_slot_values(row, schema, slot_num, empty_offer)
-
-    return sheet_data
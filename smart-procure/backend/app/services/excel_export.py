@@ -2,25 +2,32 @@
 Excel export service for inquiry sheets
 """
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from io import BytesIO
-from typing import List
+from typing import BinaryIO, List, Optional
 
 
-def export_sheet_to_excel(sheet_data: List[List], filename: str = "inquiry_sheet.xlsx") -> BytesIO:
+def export_sheet_to_excel(
+    sheet_data: List[List],
+    filename: str = "inquiry_sheet.xlsx",
+    output: Optional[BinaryIO] = None,
+) -> BinaryIO:
     """
     Export sheet data to Excel format with styling
 
     Args:
         sheet_data: 2D list of sheet data (first row is headers)
         filename: Output filename (not used, kept for compatibility)
+        output: Seekable binary file to write into (defaults to a new BytesIO)
 
     Returns:
-        BytesIO object containing the Excel file
+        The output file, rewound to the start
     """
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "询价单"
+    # 只写模式：行写入后即序列化，不在内存中保留整张工作表的单元格对象
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title="询价单")
 
     # Define styles
     header_font = Font(bold=True, color="FFFFFF")
@@ -34,11 +41,22 @@ def export_sheet_to_excel(sheet_data: List[List], filename: str = "inquiry_sheet
         bottom=Side(style='thin')
     )
 
+    # Auto-adjust column widths（只写模式下列宽须在写入行之前设置，先扫描一遍数据）
+    widths: List[int] = []
+    for row_data in sheet_data:
+        for col_idx, cell_value in enumerate(row_data):
+            if col_idx >= len(widths):
+                widths.append(0)
+            if cell_value:
+                widths[col_idx] = max(widths[col_idx], len(str(cell_value)))
+    for col_idx, max_length in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = min(max_length + 2, 50)
+
     # Write data
     for row_idx, row_data in enumerate(sheet_data, start=1):
-        for col_idx, cell_value in enumerate(row_data, start=1):
-            cell = ws.cell(row=row_idx, column=col_idx)
-            cell.value = cell_value
+        cells = []
+        for cell_value in row_data:
+            cell = WriteOnlyCell(ws, value=cell_value)
             cell.border = thin_border
 
             # Apply header styling to first row
@@ -46,24 +64,12 @@ def export_sheet_to_excel(sheet_data: List[List], filename: str = "inquiry_sheet
                 cell.font = header_font
                 cell.fill = header_fill
                 cell.alignment = header_alignment
+            cells.append(cell)
+        ws.append(cells)
 
-    # Auto-adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-
-        for cell in column:
-            try:
-                if cell.value:
-                    max_length = max(max_length, len(str(cell.value)))
-            except:
-                pass
-
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-
-    # Save to BytesIO
-    output = BytesIO()
+    # Save to the output file
+    if output is None:
+        output = BytesIO()
     wb.save(output)
     output.seek(0)
 
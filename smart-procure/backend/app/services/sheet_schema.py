@@ -1,5 +1,6 @@
 import re
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from difflib import SequenceMatcher
 
 from ..models.columns import BASIC_COLS
@@ -15,6 +16,23 @@ def normalize_header(text: Any) -> str:
     return s
 
 
+# 去除首尾空白、忽略大小写后视为未填写的单元格文本
+EMPTY_CELL_TEXTS = frozenset(("", "none", "nan", "null"))
+
+
+def cell_text(v: Any) -> str:
+    """单元格去除首尾空白后的文本；未填写（None、空串、none/nan/null）返回空串"""
+    if v is None:
+        return ""
+    s = str(v).strip()
+    return "" if s.lower() in EMPTY_CELL_TEXTS else s
+
+
+def is_cell_filled(v: Any) -> bool:
+    """单元格是否已填写，与 cell_text 判断一致；数字 0、False 视为已填"""
+    return bool(cell_text(v))
+
+
 def fuzzy_match_score(str1: str, str2: str) -> float:
     """计算两个字符串的相似度（0-100）"""
     if not str1 or not str2:
@@ -111,6 +129,20 @@ def build_sheet_schema(sheet_data: Optional[List[List[Any]]]) -> Dict[str, Any]:
     if sheet_data and len(sheet_data) >= 1 and isinstance(sheet_data[0], list):
         headers = sheet_data[0]
 
+    # schema 只取决于表头，按表头缓存；返回的 schema 为共享对象，调用方只读
+    try:
+        return _schema_for_headers(tuple(headers))
+    except TypeError:
+        # 表头中含不可哈希的单元格，直接构建
+        return _build_schema_from_headers(list(headers))
+
+
+@lru_cache(maxsize=128)
+def _schema_for_headers(headers: Tuple[Any, ...]) -> Dict[str, Any]:
+    return _build_schema_from_headers(list(headers))
+
+
+def _build_schema_from_headers(headers: List[Any]) -> Dict[str, Any]:
     header_index: Dict[str, int] = {}
     for idx, h in enumerate(headers):
         nh = normalize_header(h)
@@ -146,10 +178,35 @@ def build_sheet_schema(sheet_data: Optional[List[List[Any]]]) -> Dict[str, Any]:
         "headers": headers,
         "header_index": header_index,
         "slots": slots,
+        # 槽位号按升序排好，随 schema 一起缓存，调用方无需再排序
+        "slot_nums": sorted(slots),
         "item_columns": item_cols,
     }
 
 
+def compute_completion_rate(sheet_data: List[List[Any]], schema: Optional[Dict[str, Any]] = None) -> float:
+    """询价完成率：已填单价的格数 / (物料行数 × 槽位数)，单价是否已填按 is_cell_filled 判断"""
+    if schema is None:
+        schema = build_sheet_schema(sheet_data)
+    slots = schema.get("slots") or {}
+    item_count = len(sheet_data) - 1 if sheet_data and len(sheet_data) > 1 else 0
+    total_cells = item_count * len(slots)
+    if total_cells <= 0:
+        return 0.0
+
+    # 各槽位单价列与行无关，先取出来再逐行计数
+    price_idxs = [
+        idx for idx in ((slots.get(n) or {}).get("单价") for n in slots)
+        if isinstance(idx, int)
+    ]
+    filled_cells = 0
+    for row in sheet_data[1:]:
+        if isinstance(row, list):
+            n = len(row)
+            filled_cells += sum(1 for idx in price_idxs if idx < n and is_cell_filled(row[idx]))
+    return filled_cells / total_cells
+
+
 def get_row_snapshot(sheet_data: List[List[Any]], row_index_1_based: int) -> Optional[Dict[str, Any]]:
     if not sheet_data or row_index_1_based <= 0:
         return None
@@ -200,11 +257,7 @@ def get_row_snapshot_reduced(schema: Dict[str, Any], sheet_data: List[List[Any]]
             break
         if i in include_set:
             continue
-        v = row[i]
-        if v is None:
-            continue
-        s = str(v).strip()
-        if s == "" or s.lower() == "none":
+        if not cell_text(row[i]):
             continue
         include_set.add(i)
 
@@ -430,10 +483,7 @@ def locate_rows_by_criteria(
             if not isinstance(idx, int) or not isinstance(row, list) or idx < 0 or idx >= len(row):
                 return None
             v = row[idx]
-            if v is None:
-                return None
-            t = str(v).strip()
-            return None if t == "" or t.lower() == "none" else v
+            return v if cell_text(v) else None
         candidates.append({
             "row": row_idx,
             "score": s,
@@ -532,10 +582,7 @@ def get_row_slot_snapshot(schema: Dict[str, Any], sheet_data: List[List[Any]], r
         if idx < 0 or idx >= len(row):
             return None
         v = row[idx]
-        if v is None:
-            return None
-        s = str(v).strip()
-        return None if s == "" or s.lower() == "none" else v
+        return v if cell_text(v) else None
 
     slots: Dict[int, Dict[str, int]] = schema.get("slots") or {}
     out_slots: Dict[str, Dict[str, Any]] = {}
@@ -558,12 +605,17 @@ def get_row_slot_snapshot(schema: Dict[str, Any], sheet_data: List[List[Any]], r
     }
 
 
+# 品牌过滤的相似度阈值（品牌相似度要求较低）
+BRAND_MATCH_THRESHOLD = 70.0
+
+
 def fuzzy_match_rows(
     sheet_data: List[List[Any]],
     query: str,
     brand_filter: Optional[str] = None,
     threshold: float = 80.0,
     max_results: int = 20,
+    row_indices: Optional[Iterable[int]] = None,
 ) -> List[Dict[str, Any]]:
     """
     使用模糊匹配查找与查询字符串相似的行
@@ -574,14 +626,45 @@ def fuzzy_match_rows(
         brand_filter: 可选的品牌过滤
         threshold: 相似度阈值（0-100）
         max_results: 最多返回的结果数
+        row_indices: 可选的候选行号（1-based），只在这些行中匹配
 
     Returns:
         匹配的行列表，每个元素包含行号、相似度、字段信息
     """
+    return fuzzy_match_rows_batch(
+        sheet_data,
+        [query],
+        brand_filter=brand_filter,
+        threshold=threshold,
+        max_results=max_results,
+        row_indices=row_indices,
+    )[0]
+
+
+def fuzzy_match_rows_batch(
+    sheet_data: List[List[Any]],
+    queries: List[str],
+    brand_filter: Optional[str] = None,
+    threshold: float = 80.0,
+    max_results: int = 20,
+    row_indices: Optional[Iterable[int]] = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    对多个查询字符串做模糊匹配，只扫描表格一次
+
+    每行的字段取值、品牌过滤和标准化只做一次，再与各查询逐一比较。
+    传入 row_indices 时只扫描这些行（1-based 行号），调用方可先用廉价条件缩小范围。
+    返回与 queries 一一对应的结果列表，每项与 fuzzy_match_rows 的返回相同。
+    """
+    out: List[List[Dict[str, Any]]] = [[] for _ in queries]
     if not sheet_data or len(sheet_data) < 2:
-        return []
-    if not query or not query.strip():
-        return []
+        return out
+
+    # 空查询不参与匹配
+    active = [(qi, normalize_header(q)) for qi, q in enumerate(queries) if q and q.strip()]
+    active = [(qi, nq) for qi, nq in active if nq]
+    if not active:
+        return out
 
     headers = sheet_data[0]
     cols = infer_item_columns(headers)
@@ -590,9 +673,17 @@ def fuzzy_match_rows(
     model_col = cols.get("model")
     spec_col = cols.get("spec")
 
-    results = []
+    matcher = SequenceMatcher(None)
+    # 同一品牌在表格中反复出现，品牌相似度按取值缓存
+    brand_ok: Dict[str, bool] = {}
 
-    for i, row in enumerate(sheet_data[1:], start=2):
+    if row_indices is None:
+        rows = enumerate(sheet_data[1:], start=2)
+    else:
+        n_rows = len(sheet_data)
+        rows = ((i, sheet_data[i - 1]) for i in sorted(set(row_indices)) if 2 <= i <= n_rows)
+
+    for i, row in rows:
         if not isinstance(row, list):
             continue
 
@@ -610,46 +701,46 @@ def fuzzy_match_rows(
 
         # 品牌过滤
         if brand_filter:
-            brand_score = fuzzy_match_score(brand_filter, brand)
-            if brand_score < 70:  # 品牌相似度要求较低
+            ok = brand_ok.get(brand)
+            if ok is None:
+                ok = brand_ok[brand] = fuzzy_match_score(brand_filter, brand) >= BRAND_MATCH_THRESHOLD
+            if not ok:
                 continue
 
-        # 计算各字段的相似度
-        max_score = 0.0
-        match_field = ""
-
-        if model:
-            model_score = fuzzy_match_score(query, model)
-            if model_score > max_score:
-                max_score = model_score
-                match_field = "型号"
-
-        if name:
-            name_score = fuzzy_match_score(query, name)
-            if name_score > max_score:
-                max_score = name_score
-                match_field = "产品名称"
-
-        if spec:
-            spec_score = fuzzy_match_score(query, spec)
-            if spec_score > max_score:
-                max_score = spec_score
-                match_field = "规格"
+        # 按 型号 > 产品名称 > 规格 的优先顺序比较，同分时保留先出现的字段
+        fields = []
+        for text, label in ((model, "型号"), (name, "产品名称"), (spec, "规格")):
+            norm = normalize_header(text) if text else ""
+            if norm:
+                fields.append((norm, label))
+
+        scores = [[0.0, ""] for _ in active]
+        for norm, label in fields:
+            # SequenceMatcher 缓存第二个序列的分析结果，单元格作 seq2，各查询复用
+            matcher.set_seq2(norm)
+            for k, (_, nq) in enumerate(active):
+                matcher.set_seq1(nq)
+                score = matcher.ratio() * 100
+                if score > scores[k][0]:
+                    scores[k] = [score, label]
 
         # 如果相似度超过阈值，加入结果
-        if max_score >= threshold:
-            results.append({
-                "row": i,
-                "score": max_score,
-                "match_field": match_field,
-                "name": name or None,
-                "brand": brand or None,
-                "model": model or None,
-                "spec": spec or None,
-            })
+        for k, (qi, _) in enumerate(active):
+            max_score, match_field = scores[k]
+            if max_score >= threshold:
+                out[qi].append({
+                    "row": i,
+                    "score": max_score,
+                    "match_field": match_field,
+                    "name": name or None,
+                    "brand": brand or None,
+                    "model": model or None,
+                    "spec": spec or None,
+                })
 
     # 按相似度降序排序
-    results.sort(key=lambda x: x["score"], reverse=True)
+    for results in out:
+        results.sort(key=lambda x: x["score"], reverse=True)
 
-    return results[:max_results]
+    return [results[:max_results] for results in out]
 
@@ -4,10 +4,10 @@ Supplier service for CRUD operations
 import logging
 import re
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import or_, select, func, delete, literal, tuple_, union_all
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-from app.models.database import Supplier, InquirySheet, SupplierProduct
+from app.models.database import Supplier, InquirySheet, SupplierProduct, User
 from difflib import SequenceMatcher
 
 logger = logging.getLogger(__name__)
@@ -175,49 +175,142 @@ class SupplierService:
 
         return target_record
 
+    @staticmethod
+    def _search_condition(query: str):
+        return or_(
+            Supplier.company_name.like(f"%{query}%"),
+            Supplier.contact_phone.like(f"%{query}%"),
+            Supplier.contact_name.like(f"%{query}%")
+        )
+
     def search_suppliers(self, query: str, limit: int = 10) -> List[Supplier]:
         """Search suppliers by name, phone, or contact name"""
         return (
             self.db.query(Supplier)
-            .filter(
-                or_(
-                    Supplier.company_name.like(f"%{query}%"),
-                    Supplier.contact_phone.like(f"%{query}%"),
-                    Supplier.contact_name.like(f"%{query}%")
-                )
-            )
-            .order_by(Supplier.quote_count.desc())
+            .filter(self._search_condition(query))
+            .order_by(Supplier.quote_count.desc(), Supplier.id)
             .limit(limit)
             .all()
         )
 
+    def search_supplier_rows(self, query: str, limit: int = 10) -> list:
+        """Same matching and order as search_suppliers, but returns plain rows of the listed columns (no ORM objects)"""
+        stmt = (
+            select(
+                Supplier.id,
+                Supplier.company_name,
+                Supplier.contact_phone,
+                Supplier.contact_name,
+                Supplier.owner,
+                Supplier.tags,
+                Supplier.quote_count,
+                Supplier.last_quote_date,
+            )
+            .where(self._search_condition(query))
+            .order_by(Supplier.quote_count.desc(), Supplier.id)
+            .limit(limit)
+        )
+        return self.db.execute(stmt).all()
+
+    def search_suppliers_bulk(self, terms: List[str], per_term_limit: int = 3) -> Dict[str, List[Supplier]]:
+        """Search several terms in one query; same LIKE matching, order and per-term limit as search_suppliers"""
+        terms = [t for t in dict.fromkeys(terms) if t]
+        if not terms:
+            return {}
+
+        # 每个词一个带 LIMIT 的子查询，UNION ALL 合并后一次取回；匹配和截断都在数据库中完成
+        per_term = [
+            select(Supplier.id.label("supplier_id"), literal(idx).label("term_idx"))
+            .where(self._search_condition(t))
+            .order_by(Supplier.quote_count.desc(), Supplier.id)
+            .limit(per_term_limit)
+            .subquery()
+            for idx, t in enumerate(terms)
+        ]
+        # SQLite 不允许复合查询的成员自带 LIMIT，包一层子查询
+        matched = union_all(*[select(sq.c.supplier_id, sq.c.term_idx) for sq in per_term]).subquery()
+        rows = self.db.execute(
+            select(Supplier, matched.c.term_idx)
+            .join(matched, matched.c.supplier_id == Supplier.id)
+            .order_by(matched.c.term_idx, Supplier.quote_count.desc(), Supplier.id)
+        ).all()
+
+        results: Dict[str, List[Supplier]] = {t: [] for t in terms}
+        for supplier, term_idx in rows:
+            results[terms[term_idx]].append(supplier)
+        return results
+
     def get_supplier(self, supplier_id: int) -> Optional[Supplier]:
         """Get a single supplier by ID"""
-        return self.db.query(Supplier).filter(Supplier.id == supplier_id).first()
+        return self.db.get(Supplier, supplier_id)
 
-    def list_suppliers(self, limit: int = 50, offset: int = 0) -> List[Supplier]:
-        """Get list of suppliers, ordered by quote_count descending"""
-        return (
-            self.db.query(Supplier)
-            .order_by(Supplier.quote_count.desc())
+    def list_supplier_rows(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        batch_size: Optional[int] = None,
+        after: Optional[tuple] = None,
+    ):
+        """List supplier columns plus creator name as plain mappings (no ORM objects), ordered by (quote_count, id) descending
+
+        batch_size 不为空时使用 yield_per 分批从游标读取，返回可迭代结果而不是一次性 all()。
+        after 为上一页最后一行的 (quote_count, id)，给出时按键集分页，不再依赖 OFFSET 扫描。
+        quote_count 可为 NULL，排序和游标比较都按 0 处理，NULL 行不会被跳过，各数据库排序一致。
+        """
+        sort_count = func.coalesce(Supplier.quote_count, 0)
+        stmt = (
+            select(
+                Supplier.id,
+                Supplier.company_name,
+                Supplier.contact_phone,
+                Supplier.contact_name,
+                Supplier.owner,
+                Supplier.tags,
+                Supplier.quote_count,
+                Supplier.last_quote_date,
+                Supplier.created_at,
+                func.coalesce(User.display_name, User.username).label("created_by_name"),
+            )
+            .outerjoin(User, User.id == Supplier.created_by)
+            .order_by(sort_count.desc(), Supplier.id.desc())
             .limit(limit)
-            .offset(offset)
-            .all()
         )
+        if after is not None:
+            # 行值比较，可直接作为 ix_suppliers_list_order 上的范围条件；
+            # 冗余的首列上界让 SQLite 也能在表达式索引上定位，而不是从头扫描
+            stmt = stmt.where(
+                sort_count <= after[0],
+                tuple_(sort_count, Supplier.id) < tuple_(*after),
+            )
+        else:
+            stmt = stmt.offset(offset)
+        if batch_size:
+            return self.db.execute(stmt.execution_options(yield_per=batch_size)).mappings()
+        return self.db.execute(stmt).mappings().all()
+
+    def get_list_version(self) -> tuple:
+        """Return (row count, latest updated_at) of suppliers; changes whenever the list content changes"""
+        return tuple(self.db.execute(select(func.count(Supplier.id), func.max(Supplier.updated_at))).one())
 
     def delete_supplier(self, supplier_id: int) -> bool:
         """Delete a supplier and its associated products"""
-        supplier = self.get_supplier(supplier_id)
-        if supplier:
-            # 先删除关联的产品记录
-            self.db.query(SupplierProduct).filter(
-                SupplierProduct.supplier_id == supplier_id
-            ).delete()
-            # 再删除供应商
-            self.db.delete(supplier)
-            self.db.commit()
-            return True
-        return False
+        return bool(self.delete_suppliers([supplier_id]))
+
+    def delete_suppliers(self, supplier_ids: List[int]) -> List[int]:
+        """Delete several suppliers and their products in one transaction, returning the ids actually deleted"""
+        if not supplier_ids:
+            return []
+        # 先删除关联的产品记录
+        self.db.execute(delete(SupplierProduct).where(SupplierProduct.supplier_id.in_(supplier_ids)))
+        # 再删除供应商，RETURNING 直接拿回被删除的 id，省去先 SELECT 的一次往返
+        deleted = self.db.execute(
+            delete(Supplier).where(Supplier.id.in_(supplier_ids)).returning(Supplier.id)
+        ).scalars().all()
+        if not deleted:
+            self.db.rollback()
+            return []
+        self.db.commit()
+        return deleted
 
     def _normalize_model(self, model: str) -> str:
         """标准化型号：去除横杠、空格、斜杠，转小写"""
@@ -1,11 +1,15 @@
+import json
 import sys
 import unittest
 
 sys.path.append("smart-procure/backend")
 
+from app.core import json_utils
+from app.services.agent_runtime import _tool_results_block
 from app.services.sheet_schema import locate_rows_by_criteria
-from app.services.sheet_schema import build_sheet_schema
-from app.services.excel_core import process_update
+from app.services.sheet_schema import build_sheet_schema, compute_completion_rate
+from app.services.sheet_schema import fuzzy_match_rows, fuzzy_match_rows_batch, fuzzy_match_score
+from app.services.excel_core import get_price, merge_offers, process_update, process_updates
 from app.models.types import UpdateAction
 
 
@@ -18,6 +22,29 @@ def _build_headers():
     return headers
 
 
+def _reference_fuzzy_match(sheet, query, brand_filter=None, threshold=80.0, max_results=20, rows=None):
+    """逐行逐字段调用 fuzzy_match_score 的参考实现（列固定为 名称/型号/品牌/规格）"""
+    out = []
+    for i, row in enumerate(sheet[1:], start=2):
+        if rows is not None and i not in rows:
+            continue
+        name, model, brand, spec = (str(row[c]).strip() if row[c] is not None else "" for c in (0, 1, 2, 3))
+        if brand_filter and fuzzy_match_score(brand_filter, brand) < 70:
+            continue
+        best, label = 0.0, ""
+        for text, field in ((model, "型号"), (name, "产品名称"), (spec, "规格")):
+            score = fuzzy_match_score(query, text)
+            if score > best:
+                best, label = score, field
+        if best >= threshold:
+            out.append({
+                "row": i, "score": best, "match_field": label,
+                "name": name or None, "brand": brand or None, "model": model or None, "spec": spec or None,
+            })
+    out.sort(key=lambda x: x["score"], reverse=True)
+    return out[:max_results]
+
+
 class TestRegressions(unittest.TestCase):
     def test_schema_does_not_map_unit_as_supplier(self):
         headers = ["序号", "物品名称", "规格", "数量", "单位", "品牌", "供应商1", "单价1"]
@@ -220,6 +247,114 @@ class TestRegressions(unittest.TestCase):
         self.assertEqual(urow[headers.index("是否含运2")], "满1000包邮")
         self.assertEqual(urow[headers.index("单价3")], 60)
 
+    def test_process_updates_matches_sequential_process_update(self):
+        base = ["物品名称", "产品型号", "品牌", "数量", "单位"]
+        fields = ["品牌", "单价", "含税", "含运", "货期", "备注", "供应商"]
+        headers = list(base)
+        for s in (1, 2, 3):
+            headers += [f"{f}{s}" for f in fields]
+
+        def make_sheet():
+            rows = [list(headers)]
+            for i in range(3):
+                rows.append([f"电机{i}", f"M{i}", "西门子", "1", "台"] + [None] * (len(headers) - len(base)))
+            return rows
+
+        actions = [
+            UpdateAction(target_row=2, price=100, tax=True, shipping=True, delivery_time="现货", supplier="A"),
+            UpdateAction(target_row=3, price=90, tax=True, shipping=False, delivery_time="3天", supplier="B"),
+            UpdateAction(target_row=2, price=80, tax=False, shipping=True, delivery_time="1周", supplier="C"),
+            UpdateAction(target_row=99, price=1, tax=True, shipping=True, delivery_time="现货"),
+        ]
+
+        expected = make_sheet()
+        for action in actions:
+            expected = process_update(expected, action)
+
+        updated = process_updates(make_sheet(), actions)
+        self.assertEqual(updated, expected)
+        self.assertEqual(updated[1][headers.index("单价1")], 80.0)
+        self.assertEqual(updated[1][headers.index("供应商2")], "A")
+
+    def test_fuzzy_match_rows_batch_matches_single_queries(self):
+        headers = ["物品名称", "产品型号", "品牌", "规格", "单位"]
+        sheet = [
+            headers,
+            ["西门子电机", "1LE0001-0DB2", "西门子", "1KW", "台"],
+            ["气缸", "DSBC-32-100", "FESTO", "32mm", "个"],
+            ["气缸", "DSBC-32-150", "FESTO", "32mm", "个"],
+            ["风机", None, "ABB", "", "台"],
+        ]
+        queries = ["DSBC-32-100", "", "电机", "1LE0001"]
+
+        batch = fuzzy_match_rows_batch(sheet, queries, threshold=60.0, max_results=5)
+        self.assertEqual(len(batch), len(queries))
+        for query, got in zip(queries, batch):
+            self.assertEqual(got, _reference_fuzzy_match(sheet, query, threshold=60.0, max_results=5))
+        self.assertEqual([(m["row"], round(m["score"], 2)) for m in batch[0]], [(3, 100.0), (4, 90.91)])
+        self.assertEqual(batch[1], [])
+
+        # 品牌过滤 + 限定候选行，与参考实现在同样候选行上的结果一致
+        for rows in (None, [4, 3, 99], [4]):
+            got = fuzzy_match_rows(sheet, "DSBC-32", brand_filter="FESTO", threshold=60.0, row_indices=rows)
+            self.assertEqual(got, _reference_fuzzy_match(sheet, "DSBC-32", brand_filter="FESTO", threshold=60.0, rows=rows))
+        self.assertEqual([m["row"] for m in fuzzy_match_rows(sheet, "DSBC-32", threshold=60.0, row_indices=[4])], [4])
+
+    def test_completion_rate_price_cells(self):
+        headers = ["物料名称", "产品型号", "品牌", "数量", "单位"]
+        for s in (1, 2):
+            headers += [f"{f}{s}" for f in ["品牌", "单价", "含税", "含运", "货期", "备注", "供应商"]]
+        price1, price2 = headers.index("单价1"), headers.index("单价2")
+
+        def make_row(p1, p2):
+            row = ["电机", "M1", "西门子", 1, "台"] + [None] * 14
+            row[price1], row[price2] = p1, p2
+            return row
+
+        # 数字 0 算已填；None、空白串算未填
+        sheet = [headers, make_row(0, None), make_row(None, 12.5), make_row("  ", "8")]
+        self.assertEqual(compute_completion_rate(sheet), 3 / 6)
+        self.assertEqual(compute_completion_rate([headers]), 0.0)
+
+        # 统一空值规则：" nan "、"NULL" 等占位串不分大小写都算未填
+        sheet = [headers, make_row(0, " nan "), make_row(None, 12.5), make_row("NULL", "8")]
+        self.assertEqual(compute_completion_rate(sheet), 3 / 6)
+
+    def test_json_dumps_big_int_cells(self):
+        # 表格里的长数字编码会超出 64 位，orjson 编不了，要回退到标准库 json
+        big = 123456789012345678901234
+        relevant_rows = [{"行号": 2, "品牌": "欧姆龙", "型号": big, "规格": -big, "匹配度": "100%"}]
+        self.assertEqual(json.loads(json_utils.dumps(relevant_rows)), relevant_rows)
+        self.assertEqual(json_utils.dumps({"名称": [1, "二"]}), '{"名称":[1,"二"]}')
+
+    def test_json_dumps_bytes_sheet_detail_big_int(self):
+        big = 98765432109876543210
+        headers = _build_headers()
+        detail = {
+            "id": "s1",
+            "name": "询价单",
+            "sheet_data": [headers, ["1", "编码器", "欧姆龙", big] + [None] * (len(headers) - 4)],
+            "item_count": 1,
+            "completion_rate": 0.0,
+        }
+        self.assertEqual(json.loads(json_utils.dumps_bytes(detail)), detail)
+    def test_tool_results_block_big_int_cells(self):
+        # 工具结果带单元格原值和非字符串键，超长整数不能打断工具循环
+        big = 2 ** 70
+        results = [{"ok": True, "tool": "get_row_slot_snapshot", "result": {"row": 2, "cells": {3: big}}}]
+        decoded = json.loads(_tool_results_block(results))
+        self.assertEqual(decoded[0]["result"]["cells"], {"3": big})
+    def test_merge_offers_and_get_price_keep_write_path_empty_rule(self):
+        # 写入路径只把 None、空串、"None" 当作未填；0 和其他文本照常覆盖
+        existing = {"单价": 10, "货期": "3天", "备注": "旧", "品牌": "A"}
+        merged = merge_offers(existing, {"单价": None, "货期": "None", "备注": "", "品牌": 0})
+        self.assertEqual(merged, {"单价": 10, "货期": "3天", "备注": "旧", "品牌": 0})
+        self.assertEqual(merge_offers(existing, {"备注": "nan"})["备注"], "nan")
+
+        for empty in (None, "", "None", "null"):
+            self.assertEqual(get_price({"单价": empty}), float("inf"))
+        self.assertEqual(get_price({"单价": "12.5"}), 12.5)
+        self.assertEqual(get_price({"单价": 0}), 0.0)
 
 if __name__ == "__main__":
     unittest.main()